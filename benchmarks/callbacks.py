@@ -0,0 +1,82 @@
+import json
+
+# Request bodies for /_dash-update-component, as the Dash renderer sends
+# them. Every builder returns (callback name, body).
+
+SEARCH = {'id': 'stock-opt', 'type': 'searchStock'}
+
+WIDTH = 1200
+
+
+def prop_id(id_, prop):
+    id_ = json.dumps(id_, sort_keys=True, separators=(',', ':')) if isinstance(id_, dict) else id_
+    return f'{id_}.{prop}'
+
+
+def callback_body(outputs, inputs, state=(), changed=()):
+    # outputs are (id, prop) pairs, inputs and state (id, prop, value);
+    # changed lists the ids of the inputs that triggered the call.
+    specs = [{'id': id_, 'property': prop} for id_, prop in outputs]
+    return {
+        'output': prop_id(*outputs[0]) if len(outputs) == 1 else '..' + '...'.join(prop_id(*o) for o in outputs) + '..',
+        'outputs': specs[0] if len(specs) == 1 else specs,
+        'inputs': [{'id': id_, 'property': prop, 'value': value} for id_, prop, value in inputs],
+        'state': [{'id': id_, 'property': prop, 'value': value} for id_, prop, value in state],
+        'changedPropIds': [
+            prop_id(id_, prop) for id_, prop, _ in inputs
+            if id_ in changed or (isinstance(id_, dict) and id_['id'] in changed)
+        ],
+    }
+
+
+def graph(ticker='AAPL', period='3y', interval='1d', indicators=('OBV', 'MACD'), std=2, periods=20, smoothing=3,
+          relayout=None, view=None, changed=('ticker',), width=WIDTH, basis=None):
+    return 'update_graph', callback_body(
+        [('figure', 'data'), ('main-graph-article', 'style'), ('view-range', 'data'), ('figure-basis', 'data')],
+        [
+            ('ticker', 'data', ticker), ('period', 'value', period), ('interval', 'value', interval),
+            ('technical-indicators', 'value', list(indicators)), ('std', 'value', std), ('periods', 'value', periods),
+            ('smoothing', 'value', smoothing), ('main-graph', 'relayoutData', relayout), ('viewport', 'data', {'width': width}),
+        ],
+        [('view-range', 'data', view), ('figure-basis', 'data', basis)],
+        changed
+    )
+
+
+def ohlc(ticker='AAPL', period='3y', interval='1d', changed=('ticker',)):
+    return 'update_ohlc', callback_body(
+        [('ohlc', 'data')],
+        [('ticker', 'data', ticker), ('period', 'value', period), ('interval', 'value', interval)],
+        changed=changed
+    )
+
+
+def stock_info(ticker='AAPL'):
+    return 'update_stock_info', callback_body(
+        [('stock-ticker', 'children'), ('stock-address', 'children'), ('stock-website', 'children'),
+         ('stock-website', 'href'), ('stock-description', 'children'), ('stock-price', 'children')],
+        [('ticker', 'data', ticker)],
+        changed=('ticker',)
+    )
+
+
+def suggest(query):
+    return 'suggest_stocks', callback_body([('suggestions-list', 'children')], [(SEARCH, 'value', query)], changed=('stock-opt',))
+
+
+def most_active(n_intervals=0, version=None):
+    return 'update_most_active', callback_body(
+        [('most-active-table', 'data'), ('most-active-version', 'data')],
+        [('most-active-interval', 'n_intervals', n_intervals)],
+        [('most-active-version', 'data', version)],
+        changed=('most-active-interval',)
+    )
+
+
+def screener(n_clicks=1, source='most_active', lookback=5, std=2, periods=20, smoothing=3):
+    return 'update_screener', callback_body(
+        [('screener-table', 'data')],
+        [('screener-run', 'n_clicks', n_clicks), ('screener-source', 'value', source), ('screener-lookback', 'value', lookback)],
+        [('std', 'value', std), ('periods', 'value', periods), ('smoothing', 'value', smoothing)],
+        changed=('screener-run',)
+    )
@@ -0,0 +1,334 @@
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+sys.path.insert(0, SRC)
+
+import numpy as np
+import pandas as pd
+
+import callbacks
+from symbols import load_symbols
+
+# Replays browser sessions against /_dash-update-component of the app
+# served by gunicorn, with Yahoo replaced by benchmarks/yahoo_stub.py, and
+# reports throughput, latency percentiles and the upstream calls each
+# scenario caused. Every scenario gets a fresh app with empty caches
+# unless --target points at a running one.
+
+SCENARIOS = ('open', 'typing', 'indicators', 'zoom', 'intraday', 'mixed')
+
+SUBPLOTS = ('OBV', 'MACD', 'SO', 'A/D')
+
+VIEWS = (('5d', '1m'), ('1mo', '5m'), ('1mo', '15m'), ('1y', '1h'), ('3y', '1d'), ('max', '1wk'))
+
+
+def open_session(rng, pool):
+    # What the page requests when it loads.
+    ticker = rng.choice(pool)
+    yield callbacks.most_active(0)
+    yield callbacks.graph(ticker)
+    yield callbacks.ohlc(ticker)
+    yield callbacks.stock_info(ticker)
+
+
+def typing_session(rng, pool):
+    # The search box is debounced, so a typist sends a request per pause
+    # rather than per key; then the ticker is committed.
+    ticker = rng.choice(pool)
+    for n in sorted({1, (len(ticker) + 1) // 2, len(ticker)}):
+        yield callbacks.suggest(ticker[:n].lower())
+    yield callbacks.graph(ticker)
+    yield callbacks.ohlc(ticker)
+    yield callbacks.stock_info(ticker)
+
+
+def indicators_session(rng, pool):
+    ticker = rng.choice(pool)
+    indicators = []
+    for _ in range(4):
+        indicators = rng.sample(SUBPLOTS, rng.randint(0, len(SUBPLOTS)))
+        yield callbacks.graph(ticker, indicators=indicators, changed=('technical-indicators',))
+    yield callbacks.graph(ticker, indicators=indicators, std=rng.choice((1, 1.5, 2.5, 3)), changed=('std',))
+    yield callbacks.graph(ticker, indicators=indicators, periods=rng.choice((10, 14, 30, 50)), changed=('periods',))
+    yield callbacks.graph(ticker, indicators=indicators, smoothing=rng.choice((2, 5, 7)), changed=('smoothing',))
+
+
+def zoom_session(rng, pool):
+    # Hovering is answered in the browser from the ohlc store and sends
+    # nothing, so pointer use reaches the server as zooms, pans and resets.
+    ticker = rng.choice(pool)
+    today = pd.Timestamp.now().normalize()
+    for _ in range(4):
+        end = today - pd.Timedelta(days=rng.randint(0, 700))
+        start = end - pd.Timedelta(days=rng.choice((14, 30, 90, 180, 365)))
+        relayout = {'xaxis.range[0]': str(start.date()), 'xaxis.range[1]': str(end.date())}
+        yield callbacks.graph(ticker, relayout=relayout, changed=('main-graph',))
+    yield callbacks.graph(ticker, relayout={'xaxis.autorange': True}, changed=('main-graph',))
+
+
+def intraday_session(rng, pool):
+    ticker = rng.choice(pool)
+    for period, interval in rng.sample(VIEWS, 3):
+        yield callbacks.graph(ticker, period=period, interval=interval, changed=('interval',))
+        yield callbacks.ohlc(ticker, period=period, interval=interval, changed=('interval',))
+
+
+SESSIONS = {
+    'open': open_session,
+    'typing': typing_session,
+    'indicators': indicators_session,
+    'zoom': zoom_session,
+    'intraday': intraday_session,
+}
+
+MIX = {'open': 0.2, 'typing': 0.3, 'indicators': 0.25, 'zoom': 0.15, 'intraday': 0.1}
+
+
+def mixed_session(rng, pool):
+    name = rng.choices(list(MIX), weights=list(MIX.values()))[0]
+    return SESSIONS[name](rng, pool)
+
+
+SESSIONS['mixed'] = mixed_session
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_ready(url, process=None, timeout=180):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'{url} exited with {process.returncode}')
+        try:
+            with urlopen(url, timeout=5):
+                return
+        except OSError:
+            time.sleep(0.25)
+    raise RuntimeError(f'{url} did not come up in {timeout}s')
+
+
+def get_json(url, body=None):
+    request = Request(url, data=None if body is None else json.dumps(body).encode(), headers={'Content-Type': 'application/json'})
+    with urlopen(request, timeout=10) as response:
+        return json.load(response)
+
+
+def start_stub(args):
+    port = free_port()
+    process = subprocess.Popen([
+        sys.executable, os.path.join(HERE, 'yahoo_stub.py'), '--port', str(port), '--latency', str(args.latency),
+        '--jitter', str(args.jitter), '--error-rate', str(args.error_rate), '--error-status', str(args.error_status),
+    ])
+    url = f'http://127.0.0.1:{port}'
+    wait_ready(f'{url}/_stub/stats', process)
+    return process, url
+
+
+def start_app(args, yahoo_url):
+    # A fresh cache and bar store per app, so every scenario starts cold.
+    scratch = tempfile.mkdtemp(prefix='finance-load-')
+    port = free_port()
+    env = {
+        **os.environ,
+        'YAHOO_URL': yahoo_url,
+        'CACHE_PATH': os.path.join(scratch, 'cache.sqlite3'),
+        'STORE_DIR': os.path.join(scratch, 'bars'),
+        'WARMUP': '1' if args.warmup else '0',
+        'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+    }
+    env.pop('MOST_ACTIVE_URL', None)
+    process = subprocess.Popen([
+        sys.executable, '-m', 'gunicorn', '--chdir', SRC, 'app:server', '--bind', f'127.0.0.1:{port}',
+        '--workers', str(args.workers), '--threads', str(args.threads), '--timeout', '120',
+    ], env=env)
+    url = f'http://127.0.0.1:{port}'
+    wait_ready(f'{url}/', process)
+    return process, url
+
+
+def stop(process):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=15)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class User(threading.Thread):
+    # One browser: a kept-alive connection replaying sessions until the
+    # deadline, with `think` seconds between requests.
+    def __init__(self, url, scenario, pool, deadline, think, seed):
+        super().__init__(daemon=True)
+        parsed = urlparse(url)
+        self.host, self.port = parsed.hostname, parsed.port
+        self.scenario = scenario
+        self.pool = pool
+        self.deadline = deadline
+        self.think = think
+        self.rng = random.Random(seed)
+        self.samples = []
+        self.basis = None
+        self.conn = None
+
+    def post(self, body):
+        if self.conn is None:
+            self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+        try:
+            self.conn.request('POST', '/_dash-update-component', json.dumps(body), {'Content-Type': 'application/json'})
+            response = self.conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            self.conn.close()
+            self.conn = None
+            return 0, b''
+
+    def run(self):
+        while time.time() < self.deadline:
+            for name, body in SESSIONS[self.scenario](self.rng, self.pool):
+                if time.time() >= self.deadline:
+                    break
+                if name == 'update_graph':
+                    # Like the browser, send the basis of the figure it holds,
+                    # so parameter changes can be answered with a patch.
+                    body['state'][-1]['value'] = self.basis
+                start = time.perf_counter()
+                status, content = self.post(body)
+                self.samples.append((name, time.perf_counter() - start, status))
+                if name == 'update_graph' and status == 200:
+                    self.basis = json.loads(content)['response'].get('figure-basis', {}).get('data', self.basis)
+                if self.think:
+                    time.sleep(self.rng.expovariate(1 / self.think))
+        if self.conn is not None:
+            self.conn.close()
+
+
+def latency(times):
+    if not times:
+        return {}
+    times = np.asarray(times) * 1000
+    return {
+        'p50_ms': float(np.percentile(times, 50)),
+        'p90_ms': float(np.percentile(times, 90)),
+        'p99_ms': float(np.percentile(times, 99)),
+        'max_ms': float(times.max()),
+        'mean_ms': float(times.mean()),
+    }
+
+
+def summarize(samples, seconds):
+    # 204 is a PreventUpdate answer, which the app uses on purpose.
+    ok = [s for s in samples if s[2] in (200, 204)]
+    report = {
+        'requests': len(samples),
+        'errors': len(samples) - len(ok),
+        'seconds': seconds,
+        'throughput_rps': len(samples) / seconds if seconds else 0.0,
+        'latency': latency([s[1] for s in ok]),
+        'callbacks': {},
+    }
+    for name in sorted({s[0] for s in samples}):
+        mine = [s for s in samples if s[0] == name]
+        report['callbacks'][name] = {
+            'requests': len(mine),
+            'errors': sum(1 for s in mine if s[2] not in (200, 204)),
+            **latency([s[1] for s in mine if s[2] in (200, 204)]),
+        }
+    return report
+
+
+def run_scenario(args, url, yahoo_url, scenario, pool):
+    before = get_json(f'{yahoo_url}/_stub/stats')['counts']
+    deadline = time.time() + args.duration
+    users = [User(url, scenario, pool, deadline, args.think, args.seed * 1000 + i) for i in range(args.users)]
+    start = time.perf_counter()
+    for user in users:
+        user.start()
+    for user in users:
+        user.join()
+    seconds = time.perf_counter() - start
+
+    report = summarize([sample for user in users for sample in user.samples], seconds)
+    after = get_json(f'{yahoo_url}/_stub/stats')['counts']
+    report['upstream'] = {key: after.get(key, 0) - before.get(key, 0) for key in sorted(set(after) | set(before))}
+    return report
+
+
+def print_report(scenario, report):
+    lat = report['latency']
+    print(
+        f"{scenario:12s} {report['requests']:7d} req {report['errors']:5d} err {report['throughput_rps']:8.1f} req/s  "
+        f"p50 {lat.get('p50_ms', 0):8.1f} ms  p99 {lat.get('p99_ms', 0):8.1f} ms  upstream {report['upstream']}",
+        file=sys.stderr
+    )
+    for name, stats in report['callbacks'].items():
+        print(f"  {name:22s} {stats['requests']:7d} req {stats['errors']:5d} err  p50 {stats.get('p50_ms', 0):8.1f} ms  p99 {stats.get('p99_ms', 0):8.1f} ms", file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test of the Dash callback endpoint against a local Yahoo stand-in.')
+    parser.add_argument('--scenarios', nargs='+', choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument('--users', type=int, default=8, help='concurrent simulated browsers')
+    parser.add_argument('--duration', type=float, default=30, help='seconds per scenario')
+    parser.add_argument('--think', type=float, default=0.0, help='mean pause between requests of a user, in seconds')
+    parser.add_argument('--tickers', type=int, default=50, help='how many symbols the users pick from')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn workers')
+    parser.add_argument('--threads', type=int, default=4, help='gunicorn threads per worker')
+    parser.add_argument('--warmup', action='store_true', help='let the app warm its caches from the watchlist on start')
+    parser.add_argument('--latency', type=float, default=0.05, help='stand-in latency per upstream request, in seconds')
+    parser.add_argument('--jitter', type=float, default=0.05, help='extra stand-in latency, up to this many seconds')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream requests the stand-in fails')
+    parser.add_argument('--error-status', type=int, default=429)
+    parser.add_argument('--target', help='URL of an app that is already running; it must use --yahoo-url')
+    parser.add_argument('--yahoo-url', help='URL of a stand-in that is already running')
+    parser.add_argument('--output', default=os.path.join(HERE, 'load.json'), help='where to write the report')
+    args = parser.parse_args(argv)
+
+    symbols = load_symbols()
+    pool = [symbol for symbol, _ in symbols[:args.tickers]] or ['AAPL']
+
+    stub, yahoo_url = (None, args.yahoo_url) if args.yahoo_url else start_stub(args)
+    results = {}
+    try:
+        for scenario in args.scenarios:
+            app, url = (None, args.target) if args.target else start_app(args, yahoo_url)
+            try:
+                print(f'{scenario}...', file=sys.stderr, flush=True)
+                results[scenario] = run_scenario(args, url, yahoo_url, scenario, pool)
+                print_report(scenario, results[scenario])
+            finally:
+                stop(app)
+    finally:
+        stop(stub)
+
+    settings = {key: value for key, value in vars(args).items() if key != 'output'}
+    with open(args.output, 'w') as f:
+        json.dump({
+            'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+            'settings': settings,
+            'scenarios': results,
+        }, f, indent=1, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(os.path.dirname(HERE), 'src')
+
+# Everything the app persists goes to a scratch directory and Yahoo is
+# replaced by FakeProvider, so a run needs no network and leaves no state.
+# The environment has to be in place before the app modules are imported.
+SCRATCH = tempfile.mkdtemp(prefix='finance-bench-')
+OFFLINE_ENV = {
+    'CACHE_PATH': os.path.join(SCRATCH, 'cache.sqlite3'),
+    'STORE_DIR': os.path.join(SCRATCH, 'bars'),
+    'WARMUP': '0',
+    'LOG_LEVEL': os.getenv('LOG_LEVEL', 'WARNING'),
+}
+os.environ.update(OFFLINE_ENV)
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+sys.path.insert(0, SRC)
+
+import numpy as np
+
+import callbacks
+from synthetic import MOST_ACTIVE, FakeProvider, make_ohlcv, most_active_table
+
+SECTIONS = ('startup', 'indicators', 'figures', 'streaming', 'callbacks')
+
+INDICATOR_ROWS = (1_000, 10_000, 100_000, 1_000_000)
+FIGURE_ROWS = (1_000, 10_000, 100_000)
+STREAM_ROWS = (10_000, 100_000)
+
+WIDTH = callbacks.WIDTH
+
+
+def summarize(times):
+    times = sorted(times)
+    return {
+        'repeat': len(times),
+        'min': times[0],
+        'median': float(np.median(times)),
+        'mean': float(np.mean(times)),
+        'max': times[-1],
+    }
+
+
+def measure(fn, repeat, warmup=1):
+    # fn receives the repeat number so cases can vary their input per call.
+    for i in range(warmup):
+        fn(-1 - i)
+    times = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - start)
+    return summarize(times)
+
+
+def install_fakes():
+    from cache import shared_cache
+    import functions
+
+    functions.bar_store.provider = FakeProvider()
+    for store in functions.bar_stores.values():
+        store.provider = functions.bar_store.provider
+    # The scheduler reads the most-active table from the shared cache and
+    # only scrapes once it is stale, which it will not be during a run.
+    shared_cache.set('most_active', repr(()), most_active_table(MOST_ACTIVE))
+
+
+# Run in the timed interpreter: the fake provider cannot be swapped in before
+# the app modules are imported, so the network is blocked there instead and
+# anything startup tries to reach fails at once and is counted.
+STARTUP_CODE = '''
+import json, socket, threading, time
+attempts = []
+def connect(self, address):
+    if threading.current_thread() is threading.main_thread():
+        attempts.append(repr(address))
+    raise OSError('network is blocked')
+socket.socket.connect = connect
+start = time.perf_counter()
+import app
+print(json.dumps({'seconds': time.perf_counter() - start, 'attempts': len(attempts)}))
+'''
+
+
+def bench_startup(args, cases, checks):
+    # A fresh interpreter per sample: imports, layout and callback
+    # registration, as a worker pays them when it starts. The table seeded
+    # here reaches it through the shared cache file.
+    install_fakes()
+    times = []
+    for _ in range(max(3, args.repeat // 2)):
+        out = subprocess.run([sys.executable, '-c', STARTUP_CODE], cwd=SRC, env=os.environ.copy(), capture_output=True, text=True, check=True)
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        times.append(result['seconds'])
+        if result['attempts']:
+            checks['startup/offline'] = False
+    cases['startup/import_app'] = summarize(times)
+
+
+def bench_indicators(args, cases, checks):
+    from functions import adl_ind, bbands, macd_ind, obv_ind, stoch_ind
+    from indicators import INDICATORS, frame_bars
+    from figures import indicator_params
+
+    functions = {'obv_ind': obv_ind, 'macd_ind': macd_ind, 'stoch_ind': stoch_ind, 'adl_ind': adl_ind}
+    params = indicator_params(2, 20, 3)
+    for rows in args.rows:
+        df = make_ohlcv(rows)
+        for name, fn in functions.items():
+            cases[f'indicators/{name}/{rows}'] = measure(lambda i: fn(df), args.repeat)
+        cases[f'indicators/bbands/{rows}'] = measure(lambda i: bbands(df['Close'], window_size=20, num_of_std=2), args.repeat)
+
+        # The kernels update_graph actually runs, one fresh Plan per call.
+        bars = frame_bars(df)
+        for name, kernel in INDICATORS.items():
+            cases[f'kernels/{name}/{rows}'] = measure(lambda i: kernel(bars, **params[name]), args.repeat)
+
+
+def bench_figures(args, cases, checks):
+    from figures import SUBPLOTS, get_figure_payload
+
+    # Without ticker/version attrs nothing is cached, so every call builds,
+    # computes and serializes from scratch.
+    combos = [list(c) for r in range(len(SUBPLOTS) + 1) for c in itertools.combinations(SUBPLOTS, r)]
+    for rows in args.figure_rows:
+        df = make_ohlcv(rows, freq='1min')
+        for combo in combos:
+            name = '+'.join(combo) or 'BB'
+            cases[f'figures/{name}/{rows}'] = measure(
+                lambda i: get_figure_payload(df, 'BENCH', combo, 2, 20, 3, None, WIDTH), args.repeat
+            )
+
+
+def bench_streaming(args, cases, checks):
+    from figures import indicator_params
+    from indicators import INDICATORS, IndicatorService, frame_bars
+
+    params = indicator_params(2, 20, 3)
+    requests = [(name, params[name]) for name in INDICATORS]
+    for rows in args.stream_rows:
+        full = make_ohlcv(rows + args.repeat + 2)
+
+        def frame(n):
+            df = full.iloc[:n]
+            df.attrs.update(ticker='BENCH', interval='1m', version=('1m', n, int(full.index.asi8[n - 1])))
+            return df
+
+        # Appending bars must give what a batch computation over the whole
+        # series gives.
+        service = IndicatorService()
+        service.compute_many(frame(rows), requests)
+        extended = service.compute_many(frame(rows + 1), requests)
+        batch = [INDICATORS[name](frame_bars(frame(rows + 1)), **p) for name, p in requests]
+        for (name, _), ext, ref in zip(requests, extended, batch):
+            checks[f'streaming/parity/{name}/{rows}'] = all(
+                np.allclose(ext[key], ref[key], equal_nan=True, rtol=1e-9, atol=1e-9) for key in ref
+            )
+        if service.extended != len(requests):
+            checks[f'streaming/extended/{rows}'] = False
+
+        # One new bar per call on a warm stream.
+        cases[f'streaming/append/{rows}'] = measure(lambda i: service.compute_many(frame(rows + 3 + i), requests), args.repeat, warmup=0)
+
+
+class DashClient:
+    # Posts callback requests to the Dash server the way the renderer does.
+    def __init__(self, app):
+        self.client = app.server.test_client()
+
+    def call(self, request):
+        name, body = request
+        response = self.client.post('/_dash-update-component', json=body)
+        if response.status_code not in (200, 204):
+            raise RuntimeError(f"{name} returned {response.status_code}: {response.get_data(as_text=True)[:500]}")
+        return response
+
+
+def bench_callbacks(args, cases, checks):
+    install_fakes()
+    import app as dash_app
+    from scheduler import most_active
+
+    most_active.refresh()
+    client = DashClient(dash_app.app)
+
+    def graph(**kwargs):
+        return client.call(callbacks.graph(**kwargs))
+
+    combos = [c for r in range(1, 5) for c in itertools.combinations(('OBV', 'MACD', 'SO', 'A/D'), r)]
+    cases['callbacks/update_graph/cold'] = measure(lambda i: graph(ticker=f'BN{i + 1:03d}'), args.repeat)
+    cases['callbacks/update_graph/warm'] = measure(lambda i: graph(), args.repeat)
+    cases['callbacks/update_graph/indicators'] = measure(
+        lambda i: graph(indicators=combos[i % len(combos)], changed=('technical-indicators',)), args.repeat
+    )
+    # A patch needs the basis of the figure the browser holds.
+    basis = graph(indicators=('SO',), changed=('technical-indicators',)).get_json()['response']['figure-basis']['data']
+    cases['callbacks/update_graph/patch'] = measure(
+        lambda i: graph(indicators=('SO',), std=1 + (i % 20) / 10, periods=10 + i % 20, changed=('std', 'periods'), basis=basis),
+        args.repeat
+    )
+    cases['callbacks/update_graph/zoom'] = measure(
+        lambda i: graph(relayout={'xaxis.range[0]': f'2024-{1 + i % 6:02d}-01', 'xaxis.range[1]': '2024-09-01'}, changed=('main-graph',)),
+        args.repeat
+    )
+    cases['callbacks/update_graph/intraday'] = measure(lambda i: graph(period='1mo', interval='5m'), args.repeat)
+
+    queries = ('a', 'ap', 'appl', 'micro', 'nvida', 'bank of', 'tsla', 'goog')
+    cases['callbacks/update_ohlc'] = measure(lambda i: client.call(callbacks.ohlc()), args.repeat)
+    cases['callbacks/update_stock_info'] = measure(lambda i: client.call(callbacks.stock_info('MSFT')), args.repeat)
+    cases['callbacks/suggest_stocks'] = measure(lambda i: client.call(callbacks.suggest(queries[i % len(queries)])), args.repeat)
+    cases['callbacks/update_most_active'] = measure(lambda i: client.call(callbacks.most_active(i)), args.repeat)
+    cases['callbacks/update_screener'] = measure(lambda i: client.call(callbacks.screener(i + 2)), args.repeat)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    import pandas as pd
+    return {
+        'commit': commit or None,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold, floor):
+    # Cases whose median grew by more than `threshold` (a fraction) and by
+    # more than `floor` seconds, so sub-millisecond jitter is not reported.
+    rows = []
+    for name, case in results['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if base is None:
+            continue
+        ratio = case['median'] / base['median'] if base['median'] else float('inf')
+        regressed = ratio > 1 + threshold and case['median'] - base['median'] > floor
+        rows.append({'case': name, 'baseline': base['median'], 'current': case['median'], 'ratio': ratio, 'regressed': regressed})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline benchmarks for indicators, figure building and callbacks.')
+    parser.add_argument('--only', nargs='+', choices=SECTIONS, default=list(SECTIONS), help='sections to run')
+    parser.add_argument('--rows', nargs='+', type=int, default=list(INDICATOR_ROWS), help='series lengths for the indicator cases')
+    parser.add_argument('--figure-rows', nargs='+', type=int, default=list(FIGURE_ROWS), help='series lengths for the figure cases')
+    parser.add_argument('--stream-rows', nargs='+', type=int, default=list(STREAM_ROWS), help='series lengths for the streaming cases')
+    parser.add_argument('--repeat', type=int, default=5, help='timed calls per case')
+    parser.add_argument('--output', default=os.path.join(HERE, 'results.json'), help='where to write the results')
+    parser.add_argument('--baseline', default=os.path.join(HERE, 'baseline.json'), help='results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='also write the results to --baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown of a median, as a fraction')
+    parser.add_argument('--floor', type=float, default=0.002, help='slowdowns below this many seconds are ignored')
+    args = parser.parse_args(argv)
+
+    runners = {
+        'startup': bench_startup, 'indicators': bench_indicators, 'figures': bench_figures,
+        'streaming': bench_streaming, 'callbacks': bench_callbacks,
+    }
+    cases, checks = {}, {}
+    for section in SECTIONS:
+        if section in args.only:
+            print(f'{section}...', file=sys.stderr, flush=True)
+            runners[section](args, cases, checks)
+
+    results = {'environment': environment(), 'cases': cases, 'checks': checks}
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=1, sort_keys=True)
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+
+    for name, case in cases.items():
+        print(f"{name:60s} {case['median'] * 1000:10.2f} ms", file=sys.stderr)
+
+    failed = [name for name, ok in checks.items() if not ok]
+    for name in failed:
+        print(f'check failed: {name}', file=sys.stderr)
+
+    regressions = []
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            regressions = [row for row in compare(results, json.load(f), args.threshold, args.floor) if row['regressed']]
+        for row in regressions:
+            print(f"regression: {row['case']} {row['baseline'] * 1000:.2f} ms -> {row['current'] * 1000:.2f} ms (x{row['ratio']:.2f})", file=sys.stderr)
+
+    return 1 if failed or regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
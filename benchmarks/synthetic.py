@@ -0,0 +1,125 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from store import INTERVAL_LIMITS, NotFound, Provider, period_start
+
+TZ = 'America/New_York'
+
+# pandas frequencies of the generated bars. Intraday bars only fall on
+# weekdays between 9:30 and 16:00, like a regular US session.
+FREQUENCIES = {
+    '1m': '1min', '2m': '2min', '5m': '5min', '15m': '15min', '30m': '30min', '60m': '60min', '90m': '90min', '1h': '1h',
+    '1d': 'B', '5d': '5B', '1wk': 'W-MON', '1mo': 'MS', '3mo': 'QS'
+}
+
+LISTED = pd.Timestamp('2000-01-03', tz=TZ)
+
+# Symbols the fake most-active scrape returns; the screener runs on them.
+MOST_ACTIVE = ('AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL', 'META', 'TSLA', 'AMD', 'NFLX', 'INTC', 'PLTR', 'T', 'F', 'BAC', 'C', 'PFE', 'KO', 'XOM', 'WMT', 'DIS')
+
+
+def _noise(ts, seed, salt):
+    # Uniform values in [-1, 1) that only depend on the timestamp, so every
+    # request for the same bar returns the same prices.
+    mixed = (ts.astype(np.uint64) // np.uint64(60_000_000_000)) * np.uint64(0x9E3779B97F4A7C15)
+    mixed ^= np.uint64((seed * 0x2545F4914F6CDD1D + salt) % 2**64)
+    mixed ^= mixed >> np.uint64(31)
+    mixed *= np.uint64(0xBF58476D1CE4E5B9)
+    mixed ^= mixed >> np.uint64(29)
+    return (mixed >> np.uint64(11)).astype(np.float64) / 2.0**52 - 1.0
+
+
+def synthetic_bars(index, seed=0):
+    # Open/High/Low/Close/Volume for a DatetimeIndex: a slow cycle plus
+    # per-bar noise around a seed-dependent base price.
+    ts = index.tz_convert('UTC').as_unit('ns').asi8 if index.tz is not None else index.as_unit('ns').asi8
+    years = ts / (365.25 * 86400e9)
+    base = 20.0 + seed % 480
+    close = base * np.exp(0.25 * np.sin(2 * np.pi * years) + 0.08 * np.sin(2 * np.pi * years * 8.5) + 0.01 * _noise(ts, seed, 1))
+    open_ = close * np.exp(0.006 * _noise(ts, seed, 2))
+    high = np.maximum(open_, close) * (1 + 0.01 * np.abs(_noise(ts, seed, 3)))
+    low = np.minimum(open_, close) * (1 - 0.01 * np.abs(_noise(ts, seed, 4)))
+    volume = (1e6 * (1.5 + _noise(ts, seed, 5))).astype(np.int64)
+
+    return pd.DataFrame({'Open': open_, 'High': high, 'Low': low, 'Close': close, 'Volume': volume}, index=index)
+
+
+def make_ohlcv(rows, freq='1min', end='2024-06-28 16:00', seed=0):
+    # `rows` consecutive bars ending at `end`. Minute bars by default, so a
+    # million rows still fits the datetime64 range.
+    index = pd.date_range(end=pd.Timestamp(end, tz=TZ), periods=rows, freq=freq, name='Date')
+    return synthetic_bars(index, seed)
+
+
+def ticker_seed(ticker):
+    return zlib.crc32(ticker.encode())
+
+
+class FakeProvider(Provider):
+    # Serves synthetic bars for any ticker in place of Yahoo Finance, with
+    # the same period/start/end semantics and intraday request limits.
+    # Tickers listed in `unknown` come back empty, like a delisted symbol.
+    def __init__(self, unknown=('ZZZZ',)):
+        self.unknown = set(unknown)
+        self.calls = 0
+
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        self.calls += 1
+        if ticker in self.unknown:
+            return pd.DataFrame()
+
+        now = pd.Timestamp.now(tz=TZ)
+        end = now if end is None else pd.Timestamp(end).tz_convert(TZ)
+        if start is not None:
+            start = pd.Timestamp(start).tz_convert(TZ)
+        elif period not in (None, 'max'):
+            start = period_start(period, now)
+        start = LISTED if start is None else max(start, LISTED)
+
+        limits = INTERVAL_LIMITS.get(interval)
+        if limits is not None:
+            if end - start > pd.Timedelta(days=limits[0]) + pd.Timedelta(minutes=1):
+                raise ValueError(f"{interval} data is limited to {limits[0]} days per request")
+            start = max(start, now - pd.Timedelta(days=limits[1]))
+
+        freq = FREQUENCIES[interval]
+        if limits is not None:
+            index = pd.date_range(start.ceil(freq), end, freq=freq, name='Date')
+            index = index[index < end]
+            index = index[index.dayofweek < 5]
+            index = index.take(index.indexer_between_time('09:30', '15:59'))
+        else:
+            index = pd.date_range(start.normalize(), end, freq=freq, name='Date')
+            index = index[index >= start.normalize()]
+        if len(index) == 0:
+            return pd.DataFrame()
+
+        df = synthetic_bars(index, ticker_seed(ticker))
+        df['Dividends'] = 0.0
+        df['Stock Splits'] = 0.0
+        return df
+
+    def info(self, ticker):
+        if ticker in self.unknown:
+            raise NotFound(f"No info for {ticker}")
+        return {
+            'shortName': f'{ticker} Synthetic',
+            'city': 'Springfield',
+            'state': 'IL',
+            'website': f'https://example.com/{ticker.lower()}',
+            'longBusinessSummary': f'{ticker} is a synthetic company used by the offline benchmarks. ' * 8,
+        }
+
+
+def most_active_table(symbols=MOST_ACTIVE):
+    # The columns the Yahoo most-active scrape returns.
+    close = [float(synthetic_bars(pd.DatetimeIndex([LISTED]), ticker_seed(s))['Close'].iloc[0]) for s in symbols]
+    return pd.DataFrame({
+        'Symbol': list(symbols),
+        'Name': [f'{s} Synthetic' for s in symbols],
+        'Price (Intraday)': np.round(close, 2),
+        'Change': np.round(np.linspace(-2, 2, len(symbols)), 2),
+        '% Change': [f'{c:+.2f}%' for c in np.linspace(-1.5, 1.5, len(symbols))],
+    })
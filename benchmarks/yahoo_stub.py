@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(HERE), 'src'))
+
+import pandas as pd
+
+from store import NotFound
+from synthetic import TZ, FakeProvider, most_active_table
+
+# A stand-in for the Yahoo endpoints the app reads: the chart and
+# quoteSummary APIs (store.ChartProvider, with YAHOO_URL pointing here) and
+# the most-active page (read with pd.read_html). Prices are synthetic.
+#
+#   GET  /v8/finance/chart/<ticker>          bars, by range or period1/period2
+#   GET  /v10/finance/quoteSummary/<ticker>  assetProfile and price modules
+#   GET  /most-active                         an HTML table
+#   GET  /_stub/stats                         request counts per endpoint
+#   POST /_stub/config                        change latency or errors, JSON body
+#   POST /_stub/reset                         zero the counts
+#
+# Every upstream request waits `latency` plus up to `jitter` seconds and
+# fails with `error_status` with probability `error_rate`.
+
+
+class StubState:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=429, unknown=('ZZZZ',)):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.provider = FakeProvider(unknown=unknown)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
+
+    def reset(self):
+        with self._lock:
+            self.counts.clear()
+
+    def config(self):
+        return {'latency': self.latency, 'jitter': self.jitter, 'error_rate': self.error_rate, 'error_status': self.error_status}
+
+
+def chart(state, ticker, query):
+    period1 = query.get('period1')
+    start = pd.Timestamp(int(period1), unit='s', tz='UTC') if period1 else None
+    end = pd.Timestamp(int(query['period2']), unit='s', tz='UTC') if query.get('period2') else None
+    interval = query.get('interval', '1d')
+
+    if ticker in state.provider.unknown:
+        return 404, {'chart': {'result': None, 'error': {'code': 'Not Found', 'description': 'No data found, symbol may be delisted'}}}
+    try:
+        df = state.provider.history(ticker, period=query.get('range'), start=start, end=end, interval=interval)
+    except (KeyError, ValueError) as e:
+        return 422, {'chart': {'result': None, 'error': {'code': 'Unprocessable Entity', 'description': str(e)}}}
+
+    result = {'meta': {'currency': 'USD', 'symbol': ticker, 'exchangeTimezoneName': TZ, 'dataGranularity': interval}}
+    if not df.empty:
+        result['timestamp'] = (df.index.asi8 // 10**9).tolist()
+        result['indicators'] = {'quote': [{
+            'open': df['Open'].tolist(), 'high': df['High'].tolist(), 'low': df['Low'].tolist(),
+            'close': df['Close'].tolist(), 'volume': df['Volume'].tolist(),
+        }], 'adjclose': [{'adjclose': df['Close'].tolist()}]}
+    else:
+        result['indicators'] = {'quote': [{}]}
+    return 200, {'chart': {'result': [result], 'error': None}}
+
+
+def quote_summary(state, ticker):
+    try:
+        info = state.provider.info(ticker)
+    except NotFound as e:
+        return 404, {'quoteSummary': {'result': None, 'error': {'code': 'Not Found', 'description': str(e)}}}
+    profile = {key: info[key] for key in ('city', 'state', 'website', 'longBusinessSummary')}
+    return 200, {'quoteSummary': {'result': [{'assetProfile': profile, 'price': {'shortName': info['shortName'], 'symbol': ticker}}], 'error': None}}
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type='application/json'):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _upstream(self, endpoint):
+        # Counts the call, then applies the configured latency and errors.
+        state = self.state
+        state.count(endpoint)
+        delay = state.latency + random.uniform(0, state.jitter)
+        if delay > 0:
+            time.sleep(delay)
+        if state.error_rate and random.random() < state.error_rate:
+            state.count(f'{endpoint}:error')
+            self._send(state.error_status, {'finance': {'result': None, 'error': {'code': 'Too Many Requests'}}})
+            return False
+        return True
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+
+        if parts[:3] == ['v8', 'finance', 'chart'] and len(parts) == 4:
+            if self._upstream('chart'):
+                self._send(*chart(self.state, parts[3], query))
+        elif parts[:3] == ['v10', 'finance', 'quoteSummary'] and len(parts) == 4:
+            if self._upstream('quoteSummary'):
+                self._send(*quote_summary(self.state, parts[3]))
+        elif parts == ['most-active']:
+            if self._upstream('most_active'):
+                html = most_active_table().to_html(index=False)
+                self._send(200, f'<html><body>{html}</body></html>'.encode(), 'text/html; charset=utf-8')
+        elif parts == ['_stub', 'stats']:
+            self._send(200, {'counts': self.state.stats(), 'config': self.state.config()})
+        else:
+            self._send(404, {'error': 'not found'})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if self.path == '/_stub/reset':
+            self.state.reset()
+            self._send(200, {'counts': {}})
+        elif self.path == '/_stub/config':
+            for key in ('latency', 'jitter', 'error_rate', 'error_status'):
+                if key in body:
+                    setattr(self.state, key, type(getattr(self.state, key))(body[key]))
+            self._send(200, self.state.config())
+        else:
+            self._send(404, {'error': 'not found'})
+
+
+def make_server(host='127.0.0.1', port=8765, **config):
+    handler = type('StubHandler', (Handler,), {'state': StubState(**config)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local stand-in for the Yahoo Finance endpoints the app uses.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds added to every upstream request')
+    parser.add_argument('--jitter', type=float, default=0.05, help='up to this many extra seconds, uniformly')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of upstream requests that fail')
+    parser.add_argument('--error-status', type=int, default=429, help='HTTP status of injected failures')
+    args = parser.parse_args(argv)
+
+    server = make_server(args.host, args.port, latency=args.latency, jitter=args.jitter, error_rate=args.error_rate, error_status=args.error_status)
+    print(f'Yahoo stand-in on http://{args.host}:{server.server_address[1]}', file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
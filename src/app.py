@@ -1,18 +1,31 @@
 from datetime import datetime
 
-from dash import Dash, dcc, html, Input, Output, dash_table
+from dash import Dash, Patch, ctx, dcc, html, no_update, Input, Output, State, dash_table
 from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import dash_mantine_components as dmc
 import dash_loading_spinners as dls
 
-import colorlover as cl
-
 import pandas as pd
-
-from plotly.subplots import make_subplots
-
-from functions import adl_ind, bbands, get_cached_most_active_stocks, get_cached_stock_data, get_cached_stock_info, macd_ind, obv_ind, stoch_ind, get_stock_data
+from flask import Response
+
+from logs import configure_logging
+configure_logging()
+
+from cache import shared_cache, single_flight
+from compute import compute_pool, shared_frames
+from functions import DEFAULT_TICKER, get_cached_stock_data, get_stock_overview, stock_cache, upstream
+from indicators import indicator_service
+from metrics import instrumented, phase, register_stats, render_metrics
+from downsample import parse_relayout, period_view, width_bucket
+from figures import PARAMETER_TRACES, build_parameter_patch, figure_cache, get_figure_payload
+from transport import typed_array, wall_clock_ms
+from screener import build_panel, panel_cache, screen, screener_tickers
+from backtest import backtest_pool, rank, run_backtest
+from store import DEFAULT_INTERVAL, DEFAULT_PERIOD
+from scheduler import MOST_ACTIVE_POLL, most_active, scheduler
+from symbols import SymbolUniverse
+from warmup import start_warmup
 
 import warnings
 warnings.filterwarnings("ignore")
@@ -26,21 +39,34 @@ app = Dash(
 
 server=app.server
 
-colorscale = cl.scales['9']['qual']['Paired']
-
-df = pd.read_csv('https://raw.githubusercontent.com/lihkir/Uninorte/main/AppliedStatisticMS/DataVisualizationRPython/Lectures/Python/PythonDataSets/dash-stock-ticker-demo.csv')
-df = df.sort_values(by=['Date'], ascending=True)
-
-stock_table_data = get_cached_most_active_stocks()
-stock_table_columns_to_keep = ['Symbol', 'Price (Intraday)', 'Change', '% Change']
-stock_table_data = stock_table_data[stock_table_columns_to_keep]
-
-stock_table_data = stock_table_data.rename(columns={
-    'Symbol': 'Stock',
-    'Price (Intraday)': 'Last',
-    'Change': 'Chg',
-    '% Change': 'Chg%'
-})
+register_stats('shared_cache', shared_cache.stats)
+register_stats('single_flight', single_flight.stats)
+register_stats('stock_cache', stock_cache.stats)
+register_stats('figure_cache', figure_cache.stats)
+register_stats('indicators', lambda: {'extended': indicator_service.extended, 'evaluated': indicator_service.evaluated})
+register_stats('indicator_results', indicator_service.results.stats)
+register_stats('indicator_bars', indicator_service.bars_cache.stats)
+register_stats('indicator_streams', indicator_service.streams.stats)
+register_stats('screener_panels', panel_cache.stats)
+register_stats('upstream_breaker', upstream.stats)
+register_stats('compute_pool', compute_pool.stats)
+register_stats('backtest_pool', backtest_pool.stats)
+register_stats('shared_frames', shared_frames.stats)
+
+@server.route('/metrics')
+def metrics():
+    body, content_type = render_metrics()
+    return Response(body, content_type=content_type)
+
+# Compute processes are spawned, and import this module again as
+# __mp_main__ when the app runs as `python app.py`; only the serving
+# process starts the background jobs.
+if __name__ != '__mp_main__':
+    start_warmup()
+    scheduler.start()
+    compute_pool.start()
+
+symbol_universe = SymbolUniverse(fallback=most_active.symbols)
 
 app.layout = html.Div([
     html.Nav([
@@ -55,13 +81,15 @@ app.layout = html.Div([
                     value = 'AAPL',
                     persistence = False, 
                     autoComplete = 'off',
+                    debounce = 0.3,
                     list = 'suggestions-list',
                     style={"width": "100%", "color": "#007eff", "background-color": "transparent", "border": "none"}
                 ),
             ], style={'display': 'flex', 'align-items': 'center'}),
             html.Datalist(
                 id = 'suggestions-list',
-            )
+            ),
+            dcc.Store(id='ticker', data=DEFAULT_TICKER)
         ], style={"width": "120px", 'border-right': '1px solid #5f5f5f', 'height': '36px', 'display': 'flex'}, className="technical-aside"),
 
         html.Aside([
@@ -87,6 +115,21 @@ app.layout = html.Div([
             ),
         ], style={"min-width": "15%", "max-width": "50%", "display": "flex", "align-items": "center", 'border-right': '1px solid #5f5f5f'}, className="technical-aside"),
 
+        html.Aside([
+            dmc.Select(
+                id='period',
+                data=[{'label': period.upper(), 'value': period} for period in ('5d', '1mo', '3mo', '6mo', '1y', '3y', '5y', 'max')],
+                value=DEFAULT_PERIOD,
+                style={"width": "80px"},
+            ),
+            dmc.Select(
+                id='interval',
+                data=[{'label': interval, 'value': interval} for interval in ('1m', '5m', '15m', '30m', '1h', '1d', '1wk')],
+                value=DEFAULT_INTERVAL,
+                style={"width": "80px"},
+            ),
+        ], style={"display": "flex", "align-items": "center", "gap": "5px", 'border-right': '1px solid #5f5f5f', 'height': '36px'}, className="technical-aside"),
+
         html.Aside([
             html.Div([
                 html.Label([
@@ -117,7 +160,7 @@ app.layout = html.Div([
                 id='periods',
                 type='number',
                 min=2,
-                max=10,
+                max=50,
                 placeholder='Periods...',
                 style={
                     "color": "#007eff", 
@@ -126,6 +169,20 @@ app.layout = html.Div([
                     "border-bottom": "1px solid #5f5f5f",
                     "width": "40%"
                 }
+            ),
+            dcc.Input(
+                id='smoothing',
+                type='number',
+                min=1,
+                max=20,
+                placeholder='Smoothing...',
+                style={
+                    "color": "#007eff", 
+                    "background-color": "transparent", 
+                    "border": "none", 
+                    "border-bottom": "1px solid #5f5f5f",
+                    "width": "40%"
+                }
             )
         ], style={"display": "flex", "gap": "15px"}),       
     ], style={'display': 'flex', "justify-content": "flex-start", "align-items": "center", 'gap': '15px'}),
@@ -139,6 +196,11 @@ app.layout = html.Div([
                 dls.Grid([
                     html.Div([                
                         dcc.Graph(id='main-graph', style={"height": "95%"}),
+                        dcc.Store(id='figure'),
+                        dcc.Store(id='figure-basis'),
+                        dcc.Store(id='viewport'),
+                        dcc.Store(id='view-range'),
+                        dcc.Store(id='ohlc'),
                     ], style={"height": "95%", "margin-top": "10px"})
                 ],
                     color='#fff',
@@ -204,46 +266,55 @@ app.layout = html.Div([
                 ], style={"height": "100%"}),
                 html.Div([
                     html.Span("Most Active Stocks Today", style={"font-size": "14px", "margin-bottom": "5px", "text-align": "center",}),
-                    dash_table.DataTable(
-                        columns=[
-                            {'name': 'Stock', 'id': 'Stock', 'type': 'text'},
-                            {'name': 'Last', 'id': 'Last', 'type': 'numeric'},
-                            {'name': 'Chg', 'id': 'Chg', 'type': 'numeric'},
-                            {'name': 'Chg%', 'id': 'Chg%', 'type': 'text'}
-                        ],
-                        data=stock_table_data.to_dict('records'),
-                        row_selectable=False,
-                        #sort_action='native',
-                        page_size=10,
-                        page_current=0,
-                        style_cell={
-                            "backgroundColor": "transparent",
-                            "color": "gray",
-                            "border": "none",
-                            "font-size": "16px",
-                        },
-                        style_data_conditional=[
-                            {
-                                "if": {"column_id": "Chg", "filter_query": "{Chg} < 0"},
-                                "color": "#FF1E1E",
-                            },
-                            {
-                                "if": {"column_id": "Chg%", "filter_query": "{Chg} < 0"},
-                                "color": "#FF1E1E",
+                    dcc.Interval(id='most-active-interval', interval=MOST_ACTIVE_POLL * 1000),
+                    dcc.Store(id='most-active-version'),
+                    dls.Grid([
+                        dash_table.DataTable(
+                            id='most-active-table',
+                            columns=[
+                                {'name': 'Stock', 'id': 'Stock', 'type': 'text'},
+                                {'name': 'Last', 'id': 'Last', 'type': 'numeric'},
+                                {'name': 'Chg', 'id': 'Chg', 'type': 'numeric'},
+                                {'name': 'Chg%', 'id': 'Chg%', 'type': 'text'}
+                            ],
+                            data=[],
+                            row_selectable=False,
+                            #sort_action='native',
+                            page_size=10,
+                            page_current=0,
+                            style_cell={
+                                "backgroundColor": "transparent",
+                                "color": "gray",
+                                "border": "none",
+                                "font-size": "16px",
                             },
-                            {
-                                "if": {"column_id": "Chg", "filter_query": "{Chg} >= 0"},
-                                "color": "#16FF00",
-                            },
-                            {
-                                "if": {"column_id": "Chg%", "filter_query": "{Chg} >= 0"},
-                                "color": "#16FF00",
-                            },
-                            {
-                                "if": {"row_index": 0},
-                                "border-bottom": "1px solid rgba(0, 0, 0, 0.1)",
-                            },
-                        ],
+                            style_data_conditional=[
+                                {
+                                    "if": {"column_id": "Chg", "filter_query": "{Chg} < 0"},
+                                    "color": "#FF1E1E",
+                                },
+                                {
+                                    "if": {"column_id": "Chg%", "filter_query": "{Chg} < 0"},
+                                    "color": "#FF1E1E",
+                                },
+                                {
+                                    "if": {"column_id": "Chg", "filter_query": "{Chg} >= 0"},
+                                    "color": "#16FF00",
+                                },
+                                {
+                                    "if": {"column_id": "Chg%", "filter_query": "{Chg} >= 0"},
+                                    "color": "#16FF00",
+                                },
+                                {
+                                    "if": {"row_index": 0},
+                                    "border-bottom": "1px solid rgba(0, 0, 0, 0.1)",
+                                },
+                            ],
+                        )
+                    ],
+                        color='#fff',
+                        speed_multiplier=2,
+                        show_initially=True
                     )
                 ], style={
                         "display": "flex",
@@ -261,6 +332,139 @@ app.layout = html.Div([
 
     ], style={"display": "flex", "gap": "20px", "align-items": "flex-start"}, className="graph-section"),
 
+    html.Section([
+        html.Div([
+            html.Span("Screener", style={"font-size": "14px"}),
+            dcc.RadioItems(
+                id='screener-source',
+                options=[
+                    {'label': 'Most active', 'value': 'most_active'},
+                    {'label': 'Watchlist', 'value': 'watchlist'}
+                ],
+                value='most_active',
+                inline=True,
+                inputStyle={"margin-right": "5px", "margin-left": "10px"},
+                style={"font-size": "12px", "color": "gray"}
+            ),
+            dcc.Input(
+                id='screener-lookback',
+                type='number',
+                min=1,
+                max=60,
+                value=5,
+                placeholder='Bars...',
+                style={
+                    "color": "#007eff",
+                    "background-color": "transparent",
+                    "border": "none",
+                    "border-bottom": "1px solid #5f5f5f",
+                    "width": "60px"
+                }
+            ),
+            html.Button("Run", id='screener-run', n_clicks=0, style={"color": "#007eff", "background-color": "transparent", "border": "1px solid #5f5f5f", "border-radius": "6px", "font-size": "12px"}),
+        ], style={"display": "flex", "align-items": "center", "gap": "15px", "margin-bottom": "10px"}),
+        dls.Grid([
+            dash_table.DataTable(
+                id='screener-table',
+                columns=[
+                    {'name': 'Stock', 'id': 'Stock', 'type': 'text'},
+                    {'name': 'Last', 'id': 'Last', 'type': 'numeric'},
+                    {'name': 'Chg%', 'id': 'Chg%', 'type': 'numeric'},
+                    {'name': 'MACD Cross', 'id': 'MACD Cross', 'type': 'text'},
+                    {'name': 'Bars Ago', 'id': 'Bars Ago', 'type': 'numeric'},
+                    {'name': '%K', 'id': '%K', 'type': 'numeric'},
+                    {'name': '%B', 'id': '%B', 'type': 'numeric'},
+                    {'name': 'OBV', 'id': 'OBV Trend', 'type': 'text'},
+                    {'name': 'A/D', 'id': 'A/D Trend', 'type': 'text'}
+                ],
+                data=[],
+                sort_action='native',
+                page_size=15,
+                style_header={
+                    "backgroundColor": "transparent",
+                    "color": "#007eff",
+                    "border": "none",
+                },
+                style_cell={
+                    "backgroundColor": "transparent",
+                    "color": "gray",
+                    "border": "none",
+                    "font-size": "14px",
+                },
+                style_data_conditional=[
+                    {
+                        "if": {"column_id": "Chg%", "filter_query": "{Chg%} < 0"},
+                        "color": "#FF1E1E",
+                    },
+                    {
+                        "if": {"column_id": "Chg%", "filter_query": "{Chg%} >= 0"},
+                        "color": "#16FF00",
+                    },
+                    {
+                        "if": {"column_id": "MACD Cross", "filter_query": "{MACD Cross} = 'Bullish'"},
+                        "color": "#16FF00",
+                    },
+                    {
+                        "if": {"column_id": "MACD Cross", "filter_query": "{MACD Cross} = 'Bearish'"},
+                        "color": "#FF1E1E",
+                    },
+                ],
+            )
+        ],
+            color='#fff',
+            speed_multiplier=2,
+        ),
+    ], style={
+        "padding": "20px",
+        "border-radius": "12px",
+        "border": "1px solid rgba(255, 255, 255, 0.125)",
+        "margin-top": "20px",
+    }, className="screener-section"),
+
+    html.Section([
+        html.Div([
+            html.Span("Backtest", style={"font-size": "14px"}),
+            html.Span("Bollinger band-break, MACD and stochastic crossovers over the screener tickers", style={"font-size": "12px", "color": "gray"}),
+            html.Button("Run", id='backtest-run', n_clicks=0, style={"color": "#007eff", "background-color": "transparent", "border": "1px solid #5f5f5f", "border-radius": "6px", "font-size": "12px"}),
+        ], style={"display": "flex", "align-items": "center", "gap": "15px", "margin-bottom": "10px"}),
+        dls.Grid([
+            html.Div([
+                dcc.Graph(id='backtest-heatmap', style={"width": "60%"}),
+                dash_table.DataTable(
+                    id='backtest-table',
+                    columns=[
+                        {'name': 'Strategy', 'id': 'Strategy', 'type': 'text'},
+                        {'name': 'Params', 'id': 'Params', 'type': 'text'},
+                        {'name': 'Mean %', 'id': 'Mean %', 'type': 'numeric'},
+                        {'name': 'Beat hold', 'id': 'Beat hold', 'type': 'text'},
+                        {'name': 'Best', 'id': 'Best', 'type': 'text'}
+                    ],
+                    data=[],
+                    style_header={
+                        "backgroundColor": "transparent",
+                        "color": "#007eff",
+                        "border": "none",
+                    },
+                    style_cell={
+                        "backgroundColor": "transparent",
+                        "color": "gray",
+                        "border": "none",
+                        "font-size": "14px",
+                    },
+                    style_table={"width": "40%"},
+                ),
+            ], style={"display": "flex", "gap": "20px", "align-items": "flex-start"})
+        ],
+            color='#fff',
+            speed_multiplier=2,
+        ),
+    ], style={
+        "padding": "20px",
+        "border-radius": "12px",
+        "border": "1px solid rgba(255, 255, 255, 0.125)",
+        "margin-top": "20px",
+    }, className="backtest-section"),
+
     html.Hr(),
 
     html.Footer([
@@ -275,277 +479,269 @@ app.layout = html.Div([
     html.Br()
 ], style={"height": "100vh", "margin": "0 auto", "padding": "50px", "width": "90%"}, className="body-section")
 
+@app.callback(
+    Output('most-active-table', 'data'),
+    Output('most-active-version', 'data'),
+    Input('most-active-interval', 'n_intervals'),
+    State('most-active-version', 'data')
+)
+@instrumented('update_most_active')
+def update_most_active(n_intervals, version):
+    # The scheduler keeps the snapshot fresh; this only reads it and sends
+    # the rows that changed since the version the browser has.
+    changes = most_active.changes(version)
+    if changes is None:
+        raise PreventUpdate
+
+    version, rows = changes
+    if isinstance(rows, list):
+        return rows, version
+
+    table = Patch()
+    for index, row in rows.items():
+        table[index] = row
+
+    return table, version
+
+app.clientside_callback(
+    """
+    function(n_submit, n_blur, value, options, current) {
+        var ticker = (value || '').trim().toUpperCase();
+        if (!ticker || ticker === current) {
+            return window.dash_clientside.no_update;
+        }
+
+        // Enter and blur commit what was typed; a value change alone only
+        // commits when it is one of the suggestions (e.g. picked from the list).
+        var typed = window.dash_clientside.callback_context.triggered.every(function(t) {
+            return t.prop_id.endsWith('.value');
+        });
+        if (typed && !(options || []).some(function(option) { return option.props.value === ticker; })) {
+            return window.dash_clientside.no_update;
+        }
+        return ticker;
+    }
+    """,
+    Output('ticker', 'data'),
+    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'n_submit'),
+    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'n_blur'),
+    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'value'),
+    State('suggestions-list', 'children'),
+    State('ticker', 'data'),
+    prevent_initial_call = True
+)
+
 @app.callback(
     Output('suggestions-list', 'children'),
     Input({'id': 'stock-opt', 'type': 'searchStock'}, 'value'),
     prevent_initial_call = True
 )
+@instrumented('suggest_stocks')
 def suggest_stocks(typing):
-    all_stocks = get_cached_most_active_stocks()
-    all_stocks = all_stocks['Symbol']
-    filtered_stocks = [stock for stock in all_stocks if typing.lower() in stock.lower()]
+    with phase('search'):
+        suggestions = symbol_universe.search(typing)
+
+    return [html.Option(value=symbol, label=name or symbol) for symbol, name in suggestions]
 
-    return [html.Option(value=stock) for stock in filtered_stocks]
+app.clientside_callback(
+    """
+    function(id) {
+        var graph = document.getElementById(id);
+        return {'width': (graph && graph.offsetWidth) || window.innerWidth};
+    }
+    """,
+    Output('viewport', 'data'),
+    Input('main-graph', 'id')
+)
+
+app.clientside_callback(
+    """
+    function(figure) {
+        if (!figure) {
+            return window.dash_clientside.no_update;
+        }
+
+        // x arrays several traces share come once; hand each trace its own reference.
+        var data = figure.data.slice();
+        (figure.shared || []).forEach(function(group) {
+            group.traces.forEach(function(i) { data[i] = Object.assign({}, data[i], {x: group.x}); });
+        });
+        return {data: data, layout: figure.layout};
+    }
+    """,
+    Output('main-graph', 'figure'),
+    Input('figure', 'data')
+)
 
 @app.callback(
-    Output('main-graph','figure'),
+    Output('figure', 'data'),
     Output('main-graph-article', 'style'),
-    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'value'),
+    Output('view-range', 'data'),
+    Output('figure-basis', 'data'),
+    Input('ticker', 'data'),
+    Input('period', 'value'),
+    Input('interval', 'value'),
     Input('technical-indicators', 'value'),
     Input('std', 'value'),
-    Input('periods', 'value')
+    Input('periods', 'value'),
+    Input('smoothing', 'value'),
+    Input('main-graph', 'relayoutData'),
+    Input('viewport', 'data'),
+    State('view-range', 'data'),
+    State('figure-basis', 'data')
 )
-def update_graph(stock_search, indicators, std, periods):
-    stock_search = stock_search.upper() if stock_search else 'AAPL'
-    ticker = stock_search
-    dff = get_cached_stock_data(ticker) 
+@instrumented('update_graph')
+def update_graph(stock_search, period, interval, indicators, std, periods, smoothing, relayout, viewport, view, current_basis):
+    stock_search = stock_search.upper() if stock_search else DEFAULT_TICKER
+    period = period or DEFAULT_PERIOD
+    interval = interval or DEFAULT_INTERVAL
+
+    if ctx.triggered_id == 'main-graph':
+        change = parse_relayout(relayout)
+        if change is None:
+            raise PreventUpdate
+        view = change[1]
+    elif ctx.triggered_id in ('ticker', 'period', 'interval'):
+        view = None
+
+    with phase('data'):
+        dff = get_cached_stock_data(stock_search, DEFAULT_TICKER, period, interval)
 
     if dff.empty:
         raise PreventUpdate
 
-    row_heights = [0.4 / (len(indicators) + 1)] * (len(indicators) + 1)
-
-    fig_titles = [indicator for indicator in indicators]
-    fig_titles.insert(0, ticker)
-
-    fig = make_subplots(rows=len(indicators) + 1, cols=1, shared_xaxes=True, row_heights=row_heights, vertical_spacing=0.03, subplot_titles=fig_titles)
-
-    candlestick = {
-        'x': dff.index,
-        'open': dff['Open'],
-        'high': dff['High'],
-        'low': dff['Low'],
-        'close': dff['Close'],
-        'type': 'candlestick',
-        'name': ticker,
-        'legendgroup': ticker,
-        'showlegend': False,
-        'increasing': {'line': {'color': colorscale[0]}},
-        'decreasing': {'line': {'color': colorscale[1]}}
-    }
+    ticker = dff.attrs['ticker']
 
-    fig.add_trace(candlestick, row=1, col=1)
-
-    bb_bands = bbands(dff.Close, num_of_std=5 if std == None else std, window_size=3 if periods == None else periods)
-    bollinger_traces = [{        
-        'x': dff.index, 'y': y,
-        'type': 'scatter', 'mode': 'lines',
-        'line': {'width': 1, 'color': colorscale[(i*2) % len(colorscale)]},
-        'legendgroup': ticker,
-        'showlegend': True if i == 0 else False,
-        'name': f'{ticker} - bollinger bands'
-    } for i, y in enumerate(bb_bands)]
-
-    for bollinger_trace in bollinger_traces:
-        fig.add_trace(bollinger_trace, row=1, col=1)
-
-    fig.update_xaxes(rangeslider= {'visible':False}, row=1, col=1)
-
-    row_counter = 2
-    subplots_height = 600
-
-    if 'OBV' in indicators:
-        obv = obv_ind(dff)
-        obv_trace = {
-            'x': dff.index,
-            'y': obv['OBV'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'OBV',
-            'legendgroup': 'OBV',
-            'line': {'color': '#6F61C0'}
-        }
-        fig.add_trace(obv_trace, row=row_counter, col=1)
-
-        obv_trace = {
-            'x': dff.index,
-            'y': obv['OBV Signal'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'OBV Signal',
-            'legendgroup': 'OBV',
-            'line': {'color': '#D7BBF5'}
-        }
-        fig.add_trace(obv_trace, row=row_counter, col=1)
-
-        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-
-        row_counter += 1
-        subplots_height += 200
-
-    if 'MACD' in indicators:
-        macd = macd_ind(dff)
-        macd_trace = {
-            'x': dff.index,
-            'y': macd['MACD'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'MACD',
-            'legendgroup': 'MACD',
-            'line': {'color': '#00AD7C'}
-        }
-        fig.add_trace(macd_trace, row=row_counter, col=1)
-
-        macd_trace = {
-            'x': dff.index,
-            'y': macd['Signal'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'MACD Signal',
-            'legendgroup': 'MACD',
-            'line': {'color': '#B5FF7D'}
-        }
-        fig.add_trace(macd_trace, row=row_counter, col=1)
-
-        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-        
-        row_counter += 1
-        subplots_height += 200
-
-    if 'SO' in indicators:
-        so = stoch_ind(dff, window_size=5 if periods == None else periods)
-        so_trace = {
-            'x': dff.index,
-            'y': so['%D'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'SO',
-            'showlegend': True,
-            'legendgroup': 'SO',
-            'line': {'color': '#F90716'}
-        }
-        fig.add_trace(so_trace, row=row_counter, col=1)
-
-        so_trace = {
-            'x': dff.index,
-            'y': so['Signal'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'SO Signal',
-            'showlegend': True,
-            'legendgroup': 'SO',
-            'line': {'color': '#FFCA03'}
-        }
-        fig.add_trace(so_trace, row=row_counter, col=1)
-
-        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-
-        row_counter += 1
-        subplots_height += 200
-
-    if 'A/D' in indicators:
-        adl = adl_ind(dff)
-        adl_trace = {
-            'x': dff.index,
-            'y': adl['A/D'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'A/D',
-            'legendgroup': 'A/D',
-            'line': {'color': '#332FD0'}
-        }
-        fig.add_trace(adl_trace, row=row_counter, col=1)
-
-        adl_trace = {
-            'x': dff.index,
-            'y': adl['Signal'],
-            'type': 'scatter',
-            'mode': 'lines',
-            'name': 'A/D Signal',
-            'legendgroup': 'A/D',
-            'line': {'color': '#E15FED'}
-        }
-        fig.add_trace(adl_trace, row=row_counter, col=1)
-
-        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
-
-        row_counter += 1
-        subplots_height += 200
-
-    fig.update_layout(
-        margin={'b': 0, 'r': 10, 'l': 60, 't': 0},
-        legend={'x': 0, 'font': {'color': 'gray'}, 'orientation': 'h'},
-        plot_bgcolor='rgba(0, 0, 0, 0.0)',
-        paper_bgcolor='rgba(0, 0, 0, 0.0)',
-        xaxis={'gridcolor': '#111', 'tickfont': {'color': 'gray'}},
-        yaxis={'gridcolor': '#111', 'tickfont': {'color': 'gray'}},
-        height=subplots_height,
-        legend_y=1,
-    )
+    # The stored series may reach further back than the period; open on it.
+    if view is None:
+        view = period_view(dff.index, period)
 
-    fig.update_annotations(font_color='gray')
-
-    fig.update_layout(
-        xaxis=dict(
-            rangeselector=dict(
-                buttons=[
-                    dict(count=6,
-                        label="6M",
-                        step="month",
-                        stepmode="backward"),
-                    dict(count=1,
-                        label="1Y",
-                        step="year",
-                        stepmode="backward"),
-                    dict(count=2,
-                        label="2Y",
-                        step="year",
-                        stepmode="backward"),
-                    dict(label="ALL",
-                         step="all")
-                ]),
-            type="date"
-        ),
-        margin={'b': 30, 'r': 30, 'l': 30, 't': 30},
-    )
+    width = width_bucket(viewport.get('width') if viewport else None)
 
-    fig.update_xaxes(
-        rangeselector_bgcolor="rgb(2,0,36)",
-        rangeselector_font_color="#fff",
-        rangeselector_activecolor="rgb(44,41,94)",
-        rangeselector_bordercolor="rgba(255, 255, 255, 0.2)",
-        rangeselector_borderwidth=0.5,
-        rangeselector_yanchor="middle",
-        rangeselector_font_size=12,
-    )
+    # Parameter tweaks only touch a few traces; patch those in place, but
+    # only over a figure built from the same bars, view and width: otherwise
+    # the new y no longer lines up with the x the browser already has.
+    basis = [ticker, list(dff.attrs.get('version') or ()), view, width]
+    changed = {trigger['prop_id'].split('.')[0] for trigger in ctx.triggered if trigger['prop_id'] != '.'}
+    if changed and changed <= set(PARAMETER_TRACES) and basis == current_basis:
+        patch = build_parameter_patch(dff, indicators, std, periods, smoothing, changed, view, width)
+        if patch is None:
+            raise PreventUpdate
+        return patch, no_update, no_update, no_update
+
+    payload, subplots_height = get_figure_payload(dff, ticker, indicators, std, periods, smoothing, view, width)
 
     graph_style = {'height': f'{subplots_height}px'}
 
-    return fig, graph_style
+    return payload, graph_style, view, basis
 
 @app.callback(
-    Output('stock-levels', 'children'),
-    Input('main-graph', 'hoverData'),
-    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'value')
+    Output('ohlc', 'data'),
+    Input('ticker', 'data'),
+    Input('period', 'value'),
+    Input('interval', 'value')
 )
-def update_stock_levels(hoverData, stock_search):
-    stock_search = stock_search.upper() if stock_search else 'AAPL'
-    ticker = stock_search
-    dff = get_cached_stock_data(ticker)
+@instrumented('update_ohlc')
+def update_ohlc(stock_search, period, interval):
+    stock_search = stock_search.upper() if stock_search else DEFAULT_TICKER
+    dff = get_cached_stock_data(stock_search, DEFAULT_TICKER, period or DEFAULT_PERIOD, interval or DEFAULT_INTERVAL)
 
     if dff.empty:
         raise PreventUpdate
 
-    if hoverData is None:
-        latest_index = -1
-    else:
-        latest_index = hoverData['points'][0]['pointIndex']
+    # Sent once per series as typed arrays; the hover readout below runs in the browser.
+    return {
+        't': typed_array(wall_clock_ms(dff.index), exact=True),
+        **{level[0]: typed_array(dff[level].to_numpy()) for level in ('Open', 'High', 'Low', 'Close')}
+    }
 
-    high = round(dff['High'].iloc[latest_index], 2)
-    low = round(dff['Low'].iloc[latest_index], 2)
-    open_price = round(dff['Open'].iloc[latest_index], 2)
-    close = round(dff['Close'].iloc[latest_index], 2)
+app.clientside_callback(
+    """
+    function(hoverData, store, figure) {
+        if (!store) {
+            return window.dash_clientside.no_update;
+        }
 
-    stock_levels = [
-        html.Span([html.Span(letter), html.Span(f'{price}', style={'color': '#16FF00' if price > dff[level].iloc[latest_index - 1] else '#FF1E1E'})], style={"display": "flex", "gap": "5px"})
-        for letter, level, price in [('O', 'Open', open_price), ('H', 'High', high), ('L', 'Low', low), ('C', 'Close', close)]
-    ]
+        // Decode the base64 arrays once per series, not once per hover.
+        var cache = window.ohlcCache;
+        if (!cache || cache.store !== store) {
+            var decode = function(array) {
+                var binary = atob(array.bdata);
+                var bytes = new Uint8Array(binary.length);
+                for (var k = 0; k < binary.length; k++) {
+                    bytes[k] = binary.charCodeAt(k);
+                }
+                return array.dtype === 'f4' ? new Float32Array(bytes.buffer) : new Float64Array(bytes.buffer);
+            };
+            cache = window.ohlcCache = {store: store, ohlc: {}};
+            ['t', 'O', 'H', 'L', 'C'].forEach(function(key) { cache.ohlc[key] = decode(store[key]); });
+        }
+        var ohlc = cache.ohlc;
+        if (!ohlc.t.length) {
+            return window.dash_clientside.no_update;
+        }
 
-    return stock_levels
+        // Traces may be downsampled, so locate the hovered bar by date rather than point index.
+        var find = function(t) {
+            var lo = 0, hi = ohlc.t.length;
+            while (lo < hi) {
+                var mid = (lo + hi) >> 1;
+                if (ohlc.t[mid] <= t) { lo = mid + 1; } else { hi = mid; }
+            }
+            return lo - 1;
+        };
+        var i = ohlc.t.length - 1;
+        if (hoverData && hoverData.points.length) {
+            var x = String(hoverData.points[0].x);
+            i = Math.max(find(Date.parse(x.length > 10 ? x.replace(' ', 'T') + 'Z' : x)), 0);
+        }
+
+        // A candle may group several bars; read out the whole candle the
+        // hovered bar falls in, and compare it with the candle before.
+        var levels = function(lo, hi) {
+            var candle = {O: ohlc.O[lo], H: -Infinity, L: Infinity, C: ohlc.C[hi]};
+            for (var k = lo; k <= hi; k++) {
+                if (ohlc.H[k] > candle.H) { candle.H = ohlc.H[k]; }
+                if (ohlc.L[k] < candle.L) { candle.L = ohlc.L[k]; }
+            }
+            return candle;
+        };
+        var candles = figure && figure.layout && figure.layout.meta && figure.layout.meta.candles;
+        var lo = i, hi = i, size = 1;
+        if (candles && candles.size > 1) {
+            var first = Math.max(find(candles.start), 0), last = find(candles.end);
+            if (i >= first && i <= last) {
+                size = candles.size;
+                lo = first + Math.floor((i - first) / size) * size;
+                hi = Math.min(lo + size - 1, last);
+            }
+        }
+        var current = levels(lo, hi);
+        var before = lo > 0 ? levels(Math.max(lo - size, 0), lo - 1) : current;
+
+        return ['O', 'H', 'L', 'C'].map(function(level) {
+            var price = Math.round(current[level] * 100) / 100;
+            return {
+                namespace: 'dash_html_components', type: 'Span',
+                props: {
+                    style: {'display': 'flex', 'gap': '5px'},
+                    children: [
+                        {namespace: 'dash_html_components', type: 'Span', props: {children: level}},
+                        {namespace: 'dash_html_components', type: 'Span', props: {
+                            children: String(price),
+                            style: {'color': price > Math.round(before[level] * 100) / 100 ? '#16FF00' : '#FF1E1E'}
+                        }}
+                    ]
+                }
+            };
+        });
+    }
+    """,
+    Output('stock-levels', 'children'),
+    Input('main-graph', 'hoverData'),
+    Input('ohlc', 'data'),
+    State('figure', 'data')
+)
 
 @app.callback(
     Output('stock-ticker', 'children'),
@@ -554,19 +750,23 @@ def update_stock_levels(hoverData, stock_search):
     Output('stock-website', 'href'),
     Output('stock-description', 'children'),
     Output('stock-price', 'children'),
-    Input({'id': 'stock-opt', 'type': 'searchStock'}, 'value')
+    Input('ticker', 'data')
 )
+@instrumented('update_stock_info')
 def update_stock_info(stock_search):
     try:
-        stock_search = stock_search.upper() if stock_search else 'AAPL'
+        stock_search = stock_search.upper() if stock_search else DEFAULT_TICKER
         ticker = stock_search
-        stock_address, stock_description, stock_name, stock_website_link = get_cached_stock_info(ticker)
+        with phase('data'):
+            try:
+                stock_info, (date, close) = get_stock_overview(ticker)
+            except Exception:
+                ticker = DEFAULT_TICKER
+                stock_info, (date, close) = get_stock_overview(ticker)
+        stock_address, stock_description, stock_name, stock_website_link = stock_info
 
         stock_website = [html.H3(stock_name, style={"font-size": "12px", "margin": "0"}), html.Img(src='assets/icons/redirect.svg', style={"height": "12px"})]
 
-        dff = get_stock_data(ticker)
-        close = dff['Close'].iloc[-1]
-        date = dff.index[-1]
         formatted_date = datetime.strftime(date, '%b %d')
         date_month_day = pd.to_datetime(formatted_date, format='%b %d')
         date = date_month_day.strftime('%b %d') + ' ' + date.strftime('%H:%M') + ' UTC-4'
@@ -594,6 +794,72 @@ def update_stock_info(stock_search):
     except:
         raise PreventUpdate
 
+@app.callback(
+    Output('screener-table', 'data'),
+    Input('screener-run', 'n_clicks'),
+    Input('screener-source', 'value'),
+    Input('screener-lookback', 'value'),
+    State('std', 'value'),
+    State('periods', 'value'),
+    State('smoothing', 'value'),
+    prevent_initial_call = True
+)
+@instrumented('update_screener')
+def update_screener(n_clicks, source, lookback, std, periods, smoothing):
+    tickers = screener_tickers(source)
+    if not tickers:
+        raise PreventUpdate
+
+    with phase('data'):
+        panel = build_panel(tickers)
+    with phase('screen'):
+        results = screen(
+            panel,
+            lookback=5 if lookback == None else lookback,
+            window_size=3 if periods == None else periods,
+            num_of_std=5 if std == None else std,
+            so_lookback=14 if periods == None else periods,
+            so_smoothing=3 if smoothing == None else smoothing
+        )
+
+    return results.to_dict('records')
+
+@app.callback(
+    Output('backtest-heatmap', 'figure'),
+    Output('backtest-table', 'data'),
+    Input('backtest-run', 'n_clicks'),
+    State('screener-source', 'value'),
+    prevent_initial_call = True
+)
+@instrumented('update_backtest')
+def update_backtest(n_clicks, source):
+    results = run_backtest(screener_tickers(source))
+    if results is None:
+        raise PreventUpdate
+
+    mean_returns = results['bollinger'].mean(axis=0) * 100
+    heatmap = {
+        'data': [{
+            'type': 'heatmap',
+            'z': mean_returns.round(2),
+            'x': [str(std) for std in results['stds']],
+            'y': [str(window) for window in results['windows']],
+            'colorscale': 'RdYlGn',
+            'zmid': 0,
+            'hovertemplate': 'window=%{y}<br>std=%{x}<br>mean return=%{z}%<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': f"Bollinger mean return % ({len(results['tickers'])} tickers)", 'font': {'color': 'gray', 'size': 14}},
+            'xaxis': {'title': 'num_of_std', 'tickfont': {'color': 'gray'}, 'color': 'gray'},
+            'yaxis': {'title': 'window', 'tickfont': {'color': 'gray'}, 'color': 'gray'},
+            'plot_bgcolor': 'rgba(0, 0, 0, 0.0)',
+            'paper_bgcolor': 'rgba(0, 0, 0, 0.0)',
+            'margin': {'b': 40, 'r': 10, 'l': 50, 't': 40},
+        }
+    }
+
+    return heatmap, rank(results).to_dict('records')
+
 if __name__ == '__main__':
     app.run_server(debug=True)
 
@@ -0,0 +1,126 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from compute import ComputePool
+from functions import bbands, get_cached_stock_data
+from indicators import ewm_mean, rolling_max, rolling_mean, rolling_min
+
+WINDOWS = (5, 10, 15, 20, 30, 50)
+STDS = (1, 1.5, 2, 2.5, 3)
+SPANS = (5, 7, 9, 12, 15, 20)
+
+BACKTEST_PROCESSES = int(os.getenv('BACKTEST_PROCESSES', 0)) or os.cpu_count() or 1
+
+# Spawned once per worker on the first run and kept, rather than forking a
+# pool per click out of a worker that already runs threads.
+backtest_pool = ComputePool(BACKTEST_PROCESSES)
+
+
+def _hold(enter, exit):
+    # Long from an entry bar until the next exit bar, flat otherwise.
+    events = np.where(enter, 1.0, np.where(exit, 0.0, np.nan))
+    shape = events.shape
+    held = pd.DataFrame(events.reshape(shape[0], -1)).ffill().fillna(0.0).to_numpy()
+    return held.reshape(shape)
+
+
+def _total_return(position, close):
+    # Positions are taken on the close and earn the next bar's return.
+    returns = close[1:] / close[:-1] - 1
+    returns = returns.reshape((-1,) + (1,) * (position.ndim - 1))
+    growth = np.nan_to_num(1 + position[:-1] * returns, nan=1.0)
+    return np.prod(growth, axis=0) - 1
+
+
+def grid_series(close, high, low, windows=WINDOWS, spans=SPANS, smoothing=3):
+    price = pd.Series(close)
+    bands = [bbands(price, window_size=w, num_of_std=1) for w in windows]
+    mean = np.column_stack([middle.to_numpy() for middle, _, _ in bands])
+    std = np.column_stack([(upper - middle).to_numpy() for middle, upper, _ in bands])
+
+    macd = ewm_mean(close, 12, adjust=False) - ewm_mean(close, 26, adjust=False)
+    signal = np.column_stack([ewm_mean(macd, span, adjust=False) for span in spans])
+
+    # Stochastic %K per lookback window, smoothed into %D column-wise.
+    lowest = np.column_stack([rolling_min(low, w) for w in windows])
+    highest = np.column_stack([rolling_max(high, w) for w in windows])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        k = (close[:, None] - lowest) / (highest - lowest) * 100
+    d = rolling_mean(k, smoothing)
+
+    return {'mean': mean, 'std': std, 'macd': macd, 'signal': signal, 'k': k, 'd': d}
+
+
+def backtest_arrays(close, high, low, windows=WINDOWS, stds=STDS, spans=SPANS):
+    series = grid_series(close, high, low, windows, spans)
+    k_std = np.asarray(stds, dtype=np.float64)
+
+    # (bars, windows, stds): buy below the lower band, sell back at the middle band.
+    mean = series['mean'][:, :, None]
+    lower = mean - series['std'][:, :, None] * k_std[None, None, :]
+    price = close[:, None, None]
+    with np.errstate(invalid='ignore'):
+        bollinger = _hold(price < lower, price >= mean)
+        macd = (series['macd'][:, None] > series['signal']).astype(np.float64)
+        stoch = (series['k'] > series['d']).astype(np.float64)
+
+    return {
+        'bollinger': _total_return(bollinger, close),
+        'macd': _total_return(macd, close),
+        'stoch': _total_return(stoch, close),
+        'hold': close[-1] / close[0] - 1,
+    }
+
+
+def _backtest_ticker(args):
+    ticker, close, high, low, windows, stds, spans = args
+    return ticker, backtest_arrays(close, high, low, windows, stds, spans)
+
+
+def run_backtest(tickers, windows=WINDOWS, stds=STDS, spans=SPANS, pool=backtest_pool):
+    jobs = []
+    for ticker in tickers:
+        df = get_cached_stock_data(ticker)
+        if df.empty or df.attrs.get('ticker', ticker) != ticker or len(df) < max(windows) + 2:
+            continue
+        close, high, low = (df[c].to_numpy(dtype=np.float64) for c in ('Close', 'High', 'Low'))
+        jobs.append((ticker, close, high, low, windows, stds, spans))
+
+    if not jobs:
+        return None
+
+    results = dict(pool.map(_backtest_ticker, jobs, chunksize=max(1, len(jobs) // 32)))
+
+    names = list(results)
+    return {
+        'tickers': names,
+        'windows': list(windows),
+        'stds': list(stds),
+        'spans': list(spans),
+        'bollinger': np.stack([results[t]['bollinger'] for t in names]),
+        'macd': np.stack([results[t]['macd'] for t in names]),
+        'stoch': np.stack([results[t]['stoch'] for t in names]),
+        'hold': np.array([results[t]['hold'] for t in names]),
+    }
+
+
+def rank(results, top=10):
+    rows = []
+    for i, window in enumerate(results['windows']):
+        for j, std in enumerate(results['stds']):
+            rows.append(('Bollinger', f'window={window}, std={std}', results['bollinger'][:, i, j]))
+        rows.append(('Stochastic', f'lookback={window}', results['stoch'][:, i]))
+    for i, span in enumerate(results['spans']):
+        rows.append(('MACD', f'signal span={span}', results['macd'][:, i]))
+
+    ranked = pd.DataFrame([{
+        'Strategy': strategy,
+        'Params': params,
+        'Mean %': round(float(np.mean(returns)) * 100, 2),
+        'Beat hold': f"{int(np.sum(returns > results['hold']))}/{len(returns)}",
+        'Best': results['tickers'][int(np.argmax(returns))],
+    } for strategy, params, returns in rows])
+
+    return ranked.sort_values('Mean %', ascending=False).head(top)
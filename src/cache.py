@@ -0,0 +1,343 @@
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+
+CACHE_PATH = os.getenv('CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache.sqlite3'))
+
+# Seconds before an entry is considered stale. Stale entries are still served
+# while one worker refreshes them in the background.
+TTLS = {
+    'stock_data': int(os.getenv('TTL_STOCK_DATA', 300)),
+    'stock_info': int(os.getenv('TTL_STOCK_INFO', 86400)),
+    'most_active': int(os.getenv('TTL_MOST_ACTIVE', 300)),
+    'unknown_ticker': int(os.getenv('TTL_UNKNOWN_TICKER', 900)),
+}
+
+DEFAULT_TTL = 300
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.waiters = 0
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.calls = 0
+        self.merged = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.calls += 1
+            else:
+                call.waiters += 1
+                self.merged += 1
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def stats(self):
+        with self._lock:
+            return {'calls': self.calls, 'merged': self.merged, 'in_flight': len(self._calls)}
+
+
+single_flight = SingleFlight()
+
+
+class MemoryCache:
+    # In-process LRU bounded by bytes rather than entries: sizeof(value)
+    # reports what an entry holds and the least recently used entries are
+    # evicted once the total exceeds max_bytes. An entry larger than the
+    # whole budget is still kept alone, so the latest value is never lost.
+    # on_evict, if given, is called with every value that was evicted.
+    def __init__(self, max_bytes, sizeof, on_evict=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        evicted = []
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_bytes and len(self._entries) > 1:
+                _, (old, old_size) = self._entries.popitem(last=False)
+                self.size -= old_size
+                self.evictions += 1
+                evicted.append(old)
+
+        if self.on_evict is not None:
+            for old in evicted:
+                self.on_evict(old)
+
+    def clear(self):
+        with self._lock:
+            evicted = [value for value, _ in self._entries.values()]
+            self._entries.clear()
+            self.size = 0
+
+        if self.on_evict is not None:
+            for old in evicted:
+                self.on_evict(old)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+
+class CircuitOpen(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Stops calling an upstream after repeated failures. Once reset_after
+    # seconds have passed a single probe call is let through; its result
+    # closes the circuit again or keeps it open for another period.
+    # Exceptions listed in `ignore` are the caller's (an unknown symbol, a
+    # bad argument): they are raised without counting either way.
+    def __init__(self, name, failures=5, reset_after=30, ignore=()):
+        self.name = name
+        self.max_failures = failures
+        self.reset_after = reset_after
+        self.ignore = ignore
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def call(self, fn):
+        with self._lock:
+            if self.opened_at is not None:
+                if self.probing or time.time() - self.opened_at < self.reset_after:
+                    self.rejected += 1
+                    raise CircuitOpen(f"{self.name} unavailable")
+                self.probing = True
+
+        try:
+            value = fn()
+        except self.ignore:
+            with self._lock:
+                self.probing = False
+            raise
+        except Exception:
+            with self._lock:
+                self.failures += 1
+                if self.probing or self.failures >= self.max_failures:
+                    self.opened_at = time.time()
+                self.probing = False
+            raise
+
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+        return value
+
+    def stats(self):
+        with self._lock:
+            state = 'closed' if self.opened_at is None else ('half-open' if self.probing else 'open')
+            return {'state': state, 'failures': self.failures, 'rejected': self.rejected}
+
+
+class SharedCache:
+    def __init__(self, path=CACHE_PATH, ttls=None, lease_timeout=60, flight=None):
+        self.path = path
+        self.ttls = dict(TTLS if ttls is None else ttls)
+        self.lease_timeout = lease_timeout
+        self.flight = flight or single_flight
+        self._local = threading.local()
+        self.hits = 0
+        self.stale = 0
+        self.misses = 0
+
+    def _connect(self):
+        # Connections are never shared across threads or forked workers.
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries (kind TEXT, key TEXT, value BLOB, stored_at REAL, PRIMARY KEY (kind, key))')
+        conn.execute('CREATE TABLE IF NOT EXISTS leases (kind TEXT, key TEXT, expires_at REAL, PRIMARY KEY (kind, key))')
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def stats(self):
+        return {'hits': self.hits, 'stale': self.stale, 'misses': self.misses}
+
+    def ttl(self, kind):
+        return self.ttls.get(kind, DEFAULT_TTL)
+
+    def get(self, kind, key):
+        row = self._connect().execute(
+            'SELECT value, stored_at FROM entries WHERE kind = ? AND key = ?', (kind, key)
+        ).fetchone()
+        if row is None:
+            return None
+        return pickle.loads(row[0]), row[1]
+
+    def get_fresh(self, kind, key):
+        entry = self.get(kind, key)
+        if entry is None or time.time() - entry[1] >= self.ttl(kind):
+            return None
+        return entry[0]
+
+    def set(self, kind, key, value):
+        self._connect().execute(
+            'INSERT OR REPLACE INTO entries (kind, key, value, stored_at) VALUES (?, ?, ?, ?)',
+            (kind, key, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), time.time())
+        )
+
+    def delete(self, kind, key):
+        self._connect().execute('DELETE FROM entries WHERE kind = ? AND key = ?', (kind, key))
+
+    def _acquire(self, kind, key):
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT expires_at FROM leases WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+            if row is not None and row[0] > now:
+                return False
+            conn.execute(
+                'INSERT OR REPLACE INTO leases (kind, key, expires_at) VALUES (?, ?, ?)',
+                (kind, key, now + self.lease_timeout)
+            )
+            return True
+        finally:
+            conn.execute('COMMIT')
+
+    def _release(self, kind, key):
+        self._connect().execute('DELETE FROM leases WHERE kind = ? AND key = ?', (kind, key))
+
+    def _refresh(self, kind, key, loader):
+        try:
+            self.set(kind, key, loader())
+        except Exception as e:
+            logger.warning("cache refresh failed", extra={'kind': kind, 'key': key, 'error': str(e)})
+        finally:
+            self._release(kind, key)
+
+    def fetch(self, kind, key, loader):
+        entry = self.get(kind, key)
+        if entry is not None:
+            value, stored_at = entry
+            if time.time() - stored_at < self.ttl(kind):
+                self.hits += 1
+            else:
+                self.stale += 1
+                if self._acquire(kind, key):
+                    threading.Thread(target=self._refresh, args=(kind, key, loader), daemon=True).start()
+            return value
+
+        self.misses += 1
+        # Threads of this worker share one load, see _load_cold for other workers.
+        return self.flight.do((kind, key), lambda: self._load_cold(kind, key, loader))
+
+    def refresh(self, kind, key, loader):
+        # For background jobs: reloads a stale entry unless another worker
+        # already holds its lease, then returns the current (value, stored_at).
+        entry = self.get(kind, key)
+        if entry is not None and time.time() - entry[1] < self.ttl(kind):
+            return entry
+        if not self._acquire(kind, key):
+            return entry
+        self._refresh(kind, key, loader)
+        return self.get(kind, key)
+
+    def _load_cold(self, kind, key, loader):
+        # The lease holder loads, every other worker waits for its result.
+        entry = self.get(kind, key)
+        if entry is not None:
+            return entry[0]
+
+        deadline = time.time() + self.lease_timeout
+        leased = self._acquire(kind, key)
+        while not leased and time.time() < deadline:
+            time.sleep(0.05)
+            entry = self.get(kind, key)
+            if entry is not None:
+                return entry[0]
+            leased = self._acquire(kind, key)
+
+        try:
+            value = loader()
+            self.set(kind, key, value)
+            return value
+        finally:
+            if leased:
+                self._release(kind, key)
+
+
+shared_cache = SharedCache()
+
+
+def shared_cached(kind, cache=None):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args):
+            return (cache or shared_cache).fetch(kind, repr(args), lambda: fn(*args))
+        return wrapper
+    return decorator
@@ -0,0 +1,247 @@
+import atexit
+import hashlib
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from cache import MemoryCache
+from metrics import collect_phases, observe_phases, phase
+from store import COLUMNS, compact_frame
+
+# Processes that compute indicators and build figures for the threads of a
+# worker, so that work neither holds the worker's GIL nor waits on it.
+# 0 keeps it in the calling thread.
+COMPUTE_PROCESSES = int(os.getenv('COMPUTE_PROCESSES', 0))
+
+# Bars handed to those processes are written once per (ticker, version) to
+# a memory-backed directory and mapped read-only by every process, instead
+# of being pickled with each task.
+SHARED_DIR = os.getenv('SHARED_DIR', '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir())
+SHARED_BYTES = int(os.getenv('SHARED_BYTES', 256 * 1024 * 1024))
+
+logger = logging.getLogger(__name__)
+
+_SHARED_FILE = re.compile(r'^finance-(\d+)-[0-9a-f]+\.bin(\.tmp)?$')
+
+
+def _unlink(descriptor):
+    try:
+        os.unlink(descriptor['path'])
+    except OSError:
+        pass
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class SharedFrames:
+    # Publishes the arrays of versioned frames as files of SHARED_DIR. The
+    # file of an evicted version is unlinked; processes that still map it
+    # keep a valid mapping until they drop it.
+    def __init__(self, root=SHARED_DIR, max_bytes=SHARED_BYTES):
+        self.root = root
+        self.published = 0
+        self._files = MemoryCache(max_bytes, sizeof=lambda descriptor: descriptor['nbytes'], on_evict=_unlink)
+        self._lock = threading.Lock()
+
+    def publish(self, df):
+        # A small picklable descriptor of the frame, or None for frames
+        # without a version, which cannot be told apart once shared.
+        ticker, version = df.attrs.get('ticker'), df.attrs.get('version')
+        if ticker is None or version is None:
+            return None
+
+        key = (ticker, version)
+        descriptor = self._files.get(key)
+        if descriptor is not None:
+            return descriptor
+
+        with self._lock:
+            descriptor = self._files.get(key)
+            if descriptor is None:
+                descriptor = self._write(key, df)
+                self._files.set(key, descriptor)
+                self.published += 1
+        return descriptor
+
+    def _write(self, key, df):
+        arrays = [('ts', df.index.asi8)] + [(field, df[column].to_numpy()) for field, column in COLUMNS.items()]
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:20]
+        path = os.path.join(self.root, f'finance-{os.getpid()}-{digest}.bin')
+
+        fields = []
+        offset = 0
+        with open(path + '.tmp', 'wb') as f:
+            for field, values in arrays:
+                values = np.ascontiguousarray(values)
+                fields.append((field, values.dtype.str, offset, len(values)))
+                f.write(values.tobytes())
+                # Keeps every array 8-byte aligned.
+                padding = -values.nbytes % 8
+                f.write(b'\0' * padding)
+                offset += values.nbytes + padding
+        os.replace(path + '.tmp', path)
+
+        return {'path': path, 'nbytes': offset, 'fields': fields, 'tz': str(df.index.tz or 'UTC'), 'attrs': dict(df.attrs)}
+
+    def clear(self):
+        self._files.clear()
+
+    def sweep(self):
+        # Files are only removed at exit, so a worker that was killed
+        # (SIGKILL, the OOM killer) leaves its own behind; those of pids
+        # that no longer run are removed.
+        removed = 0
+        for name in os.listdir(self.root):
+            match = _SHARED_FILE.match(name)
+            if match is None or _alive(int(match.group(1))):
+                continue
+            try:
+                os.unlink(os.path.join(self.root, name))
+                removed += 1
+            except OSError:
+                pass
+        if removed:
+            logger.info("removed stale shared frames", extra={'files': removed, 'dir': self.root})
+        return removed
+
+    def stats(self):
+        return {**self._files.stats(), 'published': self.published}
+
+
+shared_frames = SharedFrames()
+atexit.register(shared_frames.clear)
+
+# Mappings held by a compute process, most recently used last.
+_mapped = OrderedDict()
+_mapped_lock = threading.Lock()
+
+
+def attach(descriptor):
+    # The published frame as a read-only DataFrame over the shared pages.
+    path = descriptor['path']
+    with _mapped_lock:
+        buffer = _mapped.get(path)
+        if buffer is None:
+            buffer = np.memmap(path, dtype=np.uint8, mode='r')
+            _mapped[path] = buffer
+            while len(_mapped) > 32:
+                _mapped.popitem(last=False)
+        _mapped.move_to_end(path)
+
+    compact = {'tz': descriptor['tz']}
+    for field, dtype, offset, length in descriptor['fields']:
+        compact[field] = buffer[offset:offset + np.dtype(dtype).itemsize * length].view(dtype)
+    df = compact_frame(compact)
+    df.attrs.update(descriptor['attrs'])
+    return df
+
+
+def _run(fn, descriptor, args):
+    # The phases timed here go back with the result, to be observed by the
+    # worker under the callback that asked for them.
+    with collect_phases() as phases:
+        result = fn(attach(descriptor), *args)
+    return result, phases
+
+
+class ComputePool:
+    # Runs fn(df, *args) in a bounded process pool, or in the calling
+    # thread when the pool is off or cannot take the frame. fn must be a
+    # module-level function so it pickles by name.
+    #
+    # Each process has its own module state: indicators computed there go
+    # through that process's indicator_service, whose results and streams
+    # are not the worker's and are not in its /metrics stats. Tasks of the
+    # same ticker land on any process, so expect more batch computations
+    # than the worker's own hit rate suggests; the figure cache, checked
+    # before offloading, stays in the worker.
+    def __init__(self, processes=COMPUTE_PROCESSES, frames=shared_frames):
+        self.processes = processes
+        self.frames = frames
+        self.offloaded = 0
+        self.fallbacks = 0
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        # Created on first use in each worker, after gunicorn has forked.
+        # Spawned rather than forked, since the worker already runs threads.
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=multiprocessing.get_context('spawn'))
+                self._pid = os.getpid()
+            return self._executor
+
+    def start(self):
+        # Spawns the processes now rather than on the first request.
+        if self.processes:
+            self.frames.sweep()
+            executor = self._pool()
+            for _ in range(self.processes):
+                executor.submit(os.getpid)
+
+    def _reset(self, executor):
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def run(self, fn, df, *args):
+        descriptor = self.frames.publish(df) if self.processes else None
+        if descriptor is None:
+            return fn(df, *args)
+
+        executor = self._pool()
+        try:
+            with phase('offload'):
+                result, phases = executor.submit(_run, fn, descriptor, args).result()
+            observe_phases(phases)
+            self.offloaded += 1
+            return result
+        except (BrokenProcessPool, FileNotFoundError) as e:
+            # A crashed process or a version evicted before it was mapped.
+            logger.warning("compute offload failed", extra={'function': fn.__name__, 'error': repr(e)})
+            if isinstance(e, BrokenProcessPool):
+                self._reset(executor)
+            self.fallbacks += 1
+            return fn(df, *args)
+
+    def map(self, fn, jobs, chunksize=1):
+        # [fn(job) for job in jobs] over the processes, for jobs that carry
+        # their own (picklable) data rather than a shared frame.
+        if not self.processes:
+            return [fn(job) for job in jobs]
+
+        executor = self._pool()
+        try:
+            results = list(executor.map(fn, jobs, chunksize=chunksize))
+            self.offloaded += len(jobs)
+            return results
+        except BrokenProcessPool as e:
+            logger.warning("compute offload failed", extra={'function': fn.__name__, 'error': repr(e)})
+            self._reset(executor)
+            self.fallbacks += len(jobs)
+            return [fn(job) for job in jobs]
+
+    def stats(self):
+        return {'processes': self.processes, 'offloaded': self.offloaded, 'fallbacks': self.fallbacks}
+
+
+compute_pool = ComputePool()
@@ -0,0 +1,127 @@
+import math
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from store import period_start
+
+CANDLE_PIXELS = float(os.getenv('CANDLE_PIXELS', 3))
+LINE_POINTS_PER_PIXEL = float(os.getenv('LINE_POINTS_PER_PIXEL', 1))
+DEFAULT_WIDTH = 1200
+# Widths are rounded to this step, so nearby window sizes share budgets and cached figures.
+WIDTH_STEP = int(os.getenv('WIDTH_STEP', 200))
+
+_RANGE_KEY = re.compile(r'^xaxis\d*\.range(\[[01]\])?$')
+_AUTORANGE_KEY = re.compile(r'^xaxis\d*\.autorange$')
+
+
+def width_bucket(width):
+    return max(round((width or DEFAULT_WIDTH) / WIDTH_STEP), 1) * WIDTH_STEP
+
+
+def point_budget(width):
+    # Candles need a few pixels each to stay readable; lines can use about one point per pixel.
+    width = width_bucket(width)
+    return max(int(width / CANDLE_PIXELS), 50), max(int(width * LINE_POINTS_PER_PIXEL), 100)
+
+
+def parse_relayout(relayout):
+    # Returns ('zoom', [start, end]) or ('reset', None) for range changes, None for anything else.
+    if not relayout:
+        return None
+
+    bounds = {}
+    for key, value in relayout.items():
+        if _AUTORANGE_KEY.match(key) and value:
+            return 'reset', None
+        if _RANGE_KEY.match(key):
+            if key.endswith('[0]'):
+                bounds[0] = value
+            elif key.endswith('[1]'):
+                bounds[1] = value
+            else:
+                bounds[0], bounds[1] = value
+
+    if 0 in bounds and 1 in bounds:
+        return 'zoom', [bounds[0], bounds[1]]
+    return None
+
+
+def period_view(index, period):
+    # The last `period` of the series as an x range, or None when the series
+    # is no longer than that and can be shown whole.
+    if len(index) == 0:
+        return None
+    start = period_start(period, now=index[-1])
+    if start is None or start <= index[0]:
+        return None
+    wall_clock = [t.tz_localize(None) if t.tz is not None else t for t in (start, index[-1])]
+    return [str(t) for t in wall_clock]
+
+
+def visible_slice(index, view, margin=0.5):
+    # Rows covering the visible window plus a margin on each side so short pans stay detailed.
+    n = len(index)
+    if not view:
+        return 0, n
+
+    wall_clock = index.tz_localize(None) if index.tz is not None else index
+    start = wall_clock.searchsorted(pd.Timestamp(view[0]).tz_localize(None), side='left')
+    end = wall_clock.searchsorted(pd.Timestamp(view[1]).tz_localize(None), side='right')
+    pad = int((end - start) * margin) + 1
+    return max(0, start - pad), min(n, end + pad)
+
+
+def ohlc_buckets(open_, high, low, close, budget):
+    # Start index of every bucket plus the bucket's open/high/low/close.
+    n = len(close)
+    if n <= budget:
+        return np.arange(n), open_, high, low, close
+
+    size = math.ceil(n / budget)
+    starts = np.arange(0, n, size)
+    ends = np.append(starts[1:] - 1, n - 1)
+    return (
+        starts,
+        open_[starts],
+        np.fmax.reduceat(high, starts),
+        np.fmin.reduceat(low, starts),
+        close[ends],
+    )
+
+
+def lttb(x, y, budget):
+    # Largest-Triangle-Three-Buckets: indices of the points that keep the line's shape.
+    # Missing values (indicator warm-up) are skipped rather than drawn.
+    valid = np.flatnonzero(np.isfinite(y))
+    n = len(valid)
+    if budget >= n or budget < 3:
+        return valid
+
+    x = x[valid]
+    y = y[valid]
+    every = (n - 2) / (budget - 2)
+    edges = (np.arange(budget - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # The average point of every bucket does not depend on earlier picks.
+    starts = np.append(edges, n - 1)
+    counts = np.diff(np.append(starts, n)).clip(min=1)
+    avg_x = np.add.reduceat(x, starts) / counts
+    avg_y = np.add.reduceat(y, starts) / counts
+
+    selected = np.empty(budget, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+
+    a = 0
+    for i in range(budget - 2):
+        start, end = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        area = np.abs((ax - avg_x[i + 1]) * (y[start:end] - ay) - (ax - x[start:end]) * (avg_y[i + 1] - ay))
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+
+    return valid[selected]
@@ -0,0 +1,382 @@
+import os
+
+import colorlover as cl
+import numpy as np
+import orjson
+
+from dash import Patch
+
+from plotly.io.json import to_json_plotly
+from plotly.subplots import make_subplots
+
+from cache import MemoryCache
+from compute import compute_pool
+from downsample import lttb, ohlc_buckets, point_budget, visible_slice
+from indicators import indicator_service
+from metrics import phase
+from transport import encode_figure, wall_clock_ms
+
+FIGURE_CACHE_BYTES = int(os.getenv('FIGURE_CACHE_BYTES', 64 * 1024 * 1024))
+
+colorscale = cl.scales['9']['qual']['Paired']
+
+
+# Trace order of every figure: the candlestick, the three Bollinger bands,
+# then two traces per indicator subplot in this order.
+SUBPLOTS = ('OBV', 'MACD', 'SO', 'A/D')
+
+# Traces whose values depend on each parameter input; changing only these
+# inputs patches the traces in place instead of rebuilding the figure.
+PARAMETER_TRACES = {
+    'std': ('BB',),
+    'periods': ('BB', 'SO'),
+    'smoothing': ('SO',),
+}
+
+
+def indicator_params(std, periods, smoothing):
+    return {
+        'BB': {'num_of_std': 5 if std == None else std, 'window_size': 3 if periods == None else periods},
+        'OBV': {},
+        'MACD': {},
+        'SO': {'lookback': 14 if periods == None else periods, 'window_size': 3 if smoothing == None else smoothing},
+        'A/D': {},
+    }
+
+
+def trace_window(dff, view, width):
+    # Visible x values, the candle budget and a helper that slices and
+    # downsamples the lines of one subplot: LTTB runs on the first series
+    # given and the others keep the same bars, so the subplot's lines share
+    # one x array in the payload.
+    start, end = visible_slice(dff.index, view)
+    x = wall_clock_ms(dff.index)[start:end]
+    candle_budget, line_budget = point_budget(width)
+
+    def lines(*series):
+        series = [np.asarray(y, dtype=np.float64)[start:end] for y in series]
+        keep = lttb(x, series[0], line_budget)
+        return [{'x': x[keep], 'y': y[keep]} for y in series]
+
+    return x, candle_budget, lines, (start, end)
+
+
+def shared_x(indicators):
+    # Trace indices drawn over one x array: the Bollinger bands, which keep
+    # the bars picked on the close, then the two lines of every subplot.
+    subplots = [name for name in SUBPLOTS if name in indicators]
+    return [(1, 2, 3)] + [(4 + 2 * i, 5 + 2 * i) for i in range(len(subplots))]
+
+
+def build_figure(dff, ticker, indicators, std, periods, smoothing, view=None, width=None):
+    row_heights = [0.4 / (len(indicators) + 1)] * (len(indicators) + 1)
+
+    fig_titles = [indicator for indicator in indicators]
+    fig_titles.insert(0, ticker)
+
+    fig = make_subplots(rows=len(indicators) + 1, cols=1, shared_xaxes=True, row_heights=row_heights, vertical_spacing=0.03, subplot_titles=fig_titles)
+
+    x, candle_budget, lines, (start, end) = trace_window(dff, view, width)
+
+    buckets, open_, high, low, close = ohlc_buckets(
+        *(dff[column].to_numpy()[start:end] for column in ('Open', 'High', 'Low', 'Close')),
+        candle_budget
+    )
+
+    candlestick = {
+        'x': x[buckets],
+        'open': open_,
+        'high': high,
+        'low': low,
+        'close': close,
+        'type': 'candlestick',
+        'name': ticker,
+        'legendgroup': ticker,
+        'showlegend': False,
+        'increasing': {'line': {'color': colorscale[0]}},
+        'decreasing': {'line': {'color': colorscale[1]}}
+    }
+
+    fig.add_trace(candlestick, row=1, col=1)
+
+    # Which bars each candle groups, for the hover readout in the browser.
+    if len(x):
+        size = int(buckets[1] - buckets[0]) if len(buckets) > 1 else 1
+        fig.update_layout(meta={'candles': {'start': float(x[0]), 'end': float(x[-1]), 'size': size}})
+
+    params = indicator_params(std, periods, smoothing)
+    requested = ['BB'] + [indicator for indicator in SUBPLOTS if indicator in indicators]
+    with phase('indicators'):
+        computed = dict(zip(requested, indicator_service.compute_many(dff, [(name, params[name]) for name in requested])))
+
+    bb = computed['BB']
+    bb_bands = lines(dff['Close'], bb['Middle'], bb['Upper'], bb['Lower'])[1:]
+    bollinger_traces = [{        
+        **band,
+        'type': 'scatter', 'mode': 'lines',
+        'line': {'width': 1, 'color': colorscale[(i*2) % len(colorscale)]},
+        'legendgroup': ticker,
+        'showlegend': True if i == 0 else False,
+        'name': f'{ticker} - bollinger bands'
+    } for i, band in enumerate(bb_bands)]
+
+    for bollinger_trace in bollinger_traces:
+        fig.add_trace(bollinger_trace, row=1, col=1)
+
+    fig.update_xaxes(rangeslider= {'visible':False}, row=1, col=1)
+
+    row_counter = 2
+    subplots_height = 600
+
+    if 'OBV' in indicators:
+        obv = computed['OBV']
+        obv_line, obv_signal = lines(obv['OBV'], obv['OBV Signal'])
+        obv_trace = {
+            **obv_line,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'OBV',
+            'legendgroup': 'OBV',
+            'line': {'color': '#6F61C0'}
+        }
+        fig.add_trace(obv_trace, row=row_counter, col=1)
+
+        obv_trace = {
+            **obv_signal,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'OBV Signal',
+            'legendgroup': 'OBV',
+            'line': {'color': '#D7BBF5'}
+        }
+        fig.add_trace(obv_trace, row=row_counter, col=1)
+
+        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+
+        row_counter += 1
+        subplots_height += 200
+
+    if 'MACD' in indicators:
+        macd = computed['MACD']
+        macd_line, macd_signal = lines(macd['MACD'], macd['Signal'])
+        macd_trace = {
+            **macd_line,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'MACD',
+            'legendgroup': 'MACD',
+            'line': {'color': '#00AD7C'}
+        }
+        fig.add_trace(macd_trace, row=row_counter, col=1)
+
+        macd_trace = {
+            **macd_signal,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'MACD Signal',
+            'legendgroup': 'MACD',
+            'line': {'color': '#B5FF7D'}
+        }
+        fig.add_trace(macd_trace, row=row_counter, col=1)
+
+        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+        
+        row_counter += 1
+        subplots_height += 200
+
+    if 'SO' in indicators:
+        so = computed['SO']
+        so_line, so_signal = lines(so['%D'], so['Signal'])
+        so_trace = {
+            **so_line,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'SO',
+            'showlegend': True,
+            'legendgroup': 'SO',
+            'line': {'color': '#F90716'}
+        }
+        fig.add_trace(so_trace, row=row_counter, col=1)
+
+        so_trace = {
+            **so_signal,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'SO Signal',
+            'showlegend': True,
+            'legendgroup': 'SO',
+            'line': {'color': '#FFCA03'}
+        }
+        fig.add_trace(so_trace, row=row_counter, col=1)
+
+        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+
+        row_counter += 1
+        subplots_height += 200
+
+    if 'A/D' in indicators:
+        adl = computed['A/D']
+        adl_line, adl_signal = lines(adl['A/D'], adl['Signal'])
+        adl_trace = {
+            **adl_line,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'A/D',
+            'legendgroup': 'A/D',
+            'line': {'color': '#332FD0'}
+        }
+        fig.add_trace(adl_trace, row=row_counter, col=1)
+
+        adl_trace = {
+            **adl_signal,
+            'type': 'scatter',
+            'mode': 'lines',
+            'name': 'A/D Signal',
+            'legendgroup': 'A/D',
+            'line': {'color': '#E15FED'}
+        }
+        fig.add_trace(adl_trace, row=row_counter, col=1)
+
+        fig.update_xaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+        fig.update_yaxes(gridcolor='#111', row=row_counter, col=1, tickfont=dict(color='gray'))
+
+        row_counter += 1
+        subplots_height += 200
+
+    fig.update_layout(
+        margin={'b': 0, 'r': 10, 'l': 60, 't': 0},
+        legend={'x': 0, 'font': {'color': 'gray'}, 'orientation': 'h'},
+        plot_bgcolor='rgba(0, 0, 0, 0.0)',
+        paper_bgcolor='rgba(0, 0, 0, 0.0)',
+        xaxis={'gridcolor': '#111', 'tickfont': {'color': 'gray'}},
+        yaxis={'gridcolor': '#111', 'tickfont': {'color': 'gray'}},
+        height=subplots_height,
+        legend_y=1,
+    )
+
+    fig.update_annotations(font_color='gray')
+
+    fig.update_layout(
+        xaxis=dict(
+            rangeselector=dict(
+                buttons=[
+                    dict(count=6,
+                        label="6M",
+                        step="month",
+                        stepmode="backward"),
+                    dict(count=1,
+                        label="1Y",
+                        step="year",
+                        stepmode="backward"),
+                    dict(count=2,
+                        label="2Y",
+                        step="year",
+                        stepmode="backward"),
+                    dict(label="ALL",
+                         step="all")
+                ]),
+            type="date"
+        ),
+        margin={'b': 30, 'r': 30, 'l': 30, 't': 30},
+        uirevision=f"{ticker}-{dff.attrs.get('interval')}",
+    )
+
+    if view:
+        fig.update_layout(xaxis_range=view)
+
+    fig.update_xaxes(
+        type="date",
+        rangeselector_bgcolor="rgb(2,0,36)",
+        rangeselector_font_color="#fff",
+        rangeselector_activecolor="rgb(44,41,94)",
+        rangeselector_bordercolor="rgba(255, 255, 255, 0.2)",
+        rangeselector_borderwidth=0.5,
+        rangeselector_yanchor="middle",
+        rangeselector_font_size=12,
+    )
+
+    return fig, subplots_height
+
+
+# Serialized figure payloads; keys include the data version, so a ticker
+# refresh naturally misses.
+figure_cache = MemoryCache(FIGURE_CACHE_BYTES, sizeof=lambda entry: len(entry[0]))
+
+
+def render_figure(dff, ticker, indicators, std, periods, smoothing, view=None, width=None):
+    # (serialized figure, subplots height); may run in a compute process.
+    # 'figure' includes the nested 'indicators' phase.
+    with phase('figure'):
+        fig, subplots_height = build_figure(dff, ticker, indicators, std, periods, smoothing, view, width)
+    with phase('serialize'):
+        return to_json_plotly(encode_figure(fig.to_plotly_json(), shared_x(indicators)), engine='orjson').encode(), subplots_height
+
+
+def get_figure_payload(dff, ticker, indicators, std, periods, smoothing, view=None, width=None):
+    # The visible rows and the point budget decide the payload, so they are part of the key.
+    key = (
+        ticker, dff.attrs.get('ticker'), dff.attrs.get('version'), tuple(indicators), std, periods, smoothing,
+        visible_slice(dff.index, view), point_budget(width)
+    )
+    entry = figure_cache.get(key) if key[2] is not None else None
+    if entry is None:
+        entry = compute_pool.run(render_figure, dff, ticker, indicators, std, periods, smoothing, view, width)
+        if key[2] is not None:
+            figure_cache.set(key, entry)
+
+    # Dash serializes callback responses with orjson when it is installed; a
+    # Fragment is written through as-is instead of being parsed and re-encoded.
+    payload, subplots_height = entry
+    return orjson.Fragment(payload), subplots_height
+
+
+def parameter_traces(dff, indicators, std, periods, smoothing, changed, view=None, width=None):
+    # The encoded arrays of the traces that depend on the changed inputs, by
+    # trace index, using the same window and downsampling a full build would
+    # use, and the x of every shared_x group they change, by group. The
+    # Bollinger bands keep the close's bars; the SO lines are downsampled on
+    # their own values, so their x moves with them. May run in a compute
+    # process.
+    affected = {name for input_id in changed for name in PARAMETER_TRACES[input_id]}
+    affected = [name for name in ('BB',) + SUBPLOTS if name in affected and (name == 'BB' or name in indicators)]
+    if not affected:
+        return None
+
+    params = indicator_params(std, periods, smoothing)
+    with phase('indicators'):
+        computed = dict(zip(affected, indicator_service.compute_many(dff, [(name, params[name]) for name in affected])))
+    _, _, lines, _ = trace_window(dff, view, width)
+
+    traces = {}
+    groups = {}
+    if 'BB' in computed:
+        bb = computed['BB']
+        for i, band in enumerate(lines(dff['Close'], bb['Middle'], bb['Upper'], bb['Lower'])[1:]):
+            traces[1 + i] = {'y': band['y']}
+    if 'SO' in computed:
+        group = 1 + [name for name in SUBPLOTS if name in indicators].index('SO')
+        first = shared_x(indicators)[group][0]
+        so_line, so_signal = lines(computed['SO']['%D'], computed['SO']['Signal'])
+        traces[first] = so_line
+        traces[first + 1] = {'y': so_signal['y']}
+        groups[group] = first
+
+    encoded = dict(zip(traces, encode_figure({'data': list(traces.values())})['data']))
+    return encoded, {group: encoded[index]['x'] for group, index in groups.items()}
+
+
+def build_parameter_patch(dff, indicators, std, periods, smoothing, changed, view=None, width=None):
+    traces = compute_pool.run(parameter_traces, dff, indicators, std, periods, smoothing, changed, view, width)
+    if traces is None:
+        return None
+
+    traces, shared = traces
+    patch = Patch()
+    for index, trace in traces.items():
+        patch['data'][index]['y'] = trace['y']
+    for group, x in shared.items():
+        patch['shared'][group]['x'] = x
+    return patch
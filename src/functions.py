@@ -1,23 +1,83 @@
 import numpy as np
-import yfinance as yf
 
 import pandas as pd
 
+import logging
 import os
 from dotenv import load_dotenv
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import CircuitBreaker, CircuitOpen, MemoryCache, shared_cache, shared_cached, single_flight
+from metrics import observe_upstream
+from store import DEFAULT_INTERVAL, DEFAULT_PERIOD, YAHOO_URL, BarStore, InvalidRequest, NotFound, compact_frame, compact_nbytes, period_start
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 API_KEY = os.getenv('API_KEY')
 
+DEFAULT_TICKER = 'AAPL'
+
+MOST_ACTIVE_URL = os.getenv('MOST_ACTIVE_URL', f"{(YAHOO_URL or 'https://finance.yahoo.com').rstrip('/')}/most-active?offset=0&count=100")
+
+bar_store = BarStore()
+
+# One store per bar interval, created on first use; all share the provider.
+bar_stores = {DEFAULT_INTERVAL: bar_store}
+
+def get_bar_store(interval=DEFAULT_INTERVAL):
+    store = bar_stores.get(interval)
+    if store is None:
+        store = bar_stores.setdefault(interval, BarStore(provider=bar_store.provider, root=bar_store.root, interval=interval))
+    return store
+
+# Bars kept before the requested period so indicators have settled by its
+# first bar: after 200 bars an EMA of span 26 gives what came before a
+# weight under 1e-6, and rolling windows are far shorter.
+INDICATOR_WARMUP = int(os.getenv('INDICATOR_WARMUP', 200))
+SLICE_ROWS = 256
+
+# Compact bars of recently used (ticker, version) pairs, bounded by bytes.
+STOCK_CACHE_BYTES = int(os.getenv('STOCK_CACHE_BYTES', 64 * 1024 * 1024))
+stock_cache = MemoryCache(STOCK_CACHE_BYTES, sizeof=compact_nbytes)
+
+# Shared by every Yahoo call of this worker; while it is open, requests are
+# answered from local data instead of waiting on a failing upstream.
+upstream = CircuitBreaker(
+    'Yahoo Finance',
+    failures=int(os.getenv('BREAKER_FAILURES', 5)),
+    reset_after=int(os.getenv('BREAKER_RESET', 30)),
+    ignore=(NotFound, InvalidRequest)
+)
+
+# Runs independent upstream lookups of one request side by side.
+io_pool = ThreadPoolExecutor(max_workers=int(os.getenv('IO_THREADS', 8)), thread_name_prefix='io')
+
+def call_upstream(name, fn):
+    return observe_upstream(name, lambda: upstream.call(fn), rejected=CircuitOpen, not_found=NotFound)
+
+class UnknownTicker(Exception):
+    pass
+
+class NoIntradayData(Exception):
+    pass
+
+def is_unknown_ticker(ticker):
+    return shared_cache.get_fresh('unknown_ticker', ticker) is not None
+
+def remember_unknown_ticker(ticker):
+    shared_cache.set('unknown_ticker', ticker, True)
+
 def obv_ind(df):
+    df = df.copy()
     df['OBV'] = np.where(df['Close'] > df['Close'].shift(1), df['Volume'], np.where(df['Close'] < df['Close'].shift(1), -df['Volume'], 0)).cumsum()
     df['OBV Signal'] = df['OBV'].ewm(span=9).mean()
 
     return df
 
 def macd_ind(df):
+    df = df.copy()
     df['EMA12'] = df['Close'].ewm(span=12, adjust=False).mean()
     df['EMA26'] = df['Close'].ewm(span=26, adjust=False).mean()
     df['MACD'] = df['EMA12'] - df['EMA26']
@@ -25,15 +85,18 @@ def macd_ind(df):
 
     return df
 
-def stoch_ind(df, window_size=5):
-    df['High-Low'] = df['High'] - df['Low']
-    df['%K'] = (df['Close'] - df['Low']) / df['High-Low'] * 100
+def stoch_ind(df, window_size=3, lookback=14):
+    df = df.copy()
+    df['Lowest Low'] = df['Low'].rolling(window=lookback).min()
+    df['Highest High'] = df['High'].rolling(window=lookback).max()
+    df['%K'] = (df['Close'] - df['Lowest Low']) / (df['Highest High'] - df['Lowest Low']) * 100
     df['%D'] = df['%K'].rolling(window=window_size).mean()
     df['Signal'] = df['%K'].ewm(span=9).mean()
 
     return df    
 
 def adl_ind(df):
+    df = df.copy()
     df['MFM'] = ((df['Close'] - df['Low']) - (df['High'] - df['Close'])) / (df['High'] - df['Low'])
     df['ADL'] = df['MFM'] * df['Volume']
     df['A/D'] = df['ADL'].cumsum()
@@ -48,24 +111,91 @@ def bbands(price, window_size=10, num_of_std=5):
     lower_band = rolling_mean - (rolling_std*num_of_std)
     return rolling_mean, upper_band, lower_band
 
-def get_stock_data(ticker):
+def refresh_stock_data(ticker, period=DEFAULT_PERIOD, interval=DEFAULT_INTERVAL):
+    if is_unknown_ticker(ticker):
+        raise UnknownTicker(ticker)
+    store = get_bar_store(interval)
+
+    def load():
+        version = call_upstream('history', lambda: store.refresh(ticker, period=period))
+        if version[0] == 0:
+            # Only the daily series says a symbol does not exist; plenty of
+            # real symbols have no intraday bars.
+            if interval == DEFAULT_INTERVAL:
+                remember_unknown_ticker(ticker)
+                raise UnknownTicker(ticker)
+            raise NoIntradayData(f"No {interval} bars for {ticker}")
+        return version
+
+    try:
+        return single_flight.do(('history', ticker, period, interval), load)
+    except (UnknownTicker, NoIntradayData, InvalidRequest):
+        raise
+    except Exception:
+        # Upstream failing, answering garbage or circuit open: stored bars
+        # beat no bars.
+        version = store.version(ticker)
+        if version[0] == 0:
+            raise
+        return version
+
+@shared_cached('stock_data')
+def _cached_stock_version(ticker, period, interval):
+    return refresh_stock_data(ticker, period, interval)
+
+def get_cached_stock_version(ticker, period=DEFAULT_PERIOD, interval=DEFAULT_INTERVAL):
+    # Always keyed on all three arguments, however the caller passed them.
+    return _cached_stock_version(ticker, period, interval)
+
+def period_row(bars, period):
+    # First row of `period` less the indicator warm-up, rounded down to a
+    # multiple of SLICE_ROWS so it stays put while new bars arrive and the
+    # indicator streams keep extending.
+    ts = bars['ts']
+    if period is None or len(ts) == 0:
+        return 0
+    start = period_start(period, now=pd.Timestamp(int(ts[-1]), unit='ns', tz='UTC').tz_convert(bars['tz']))
+    if start is None:
+        return 0
+    row = int(np.searchsorted(ts, start.value)) - INDICATOR_WARMUP
+    return max(0, row // SLICE_ROWS * SLICE_ROWS)
+
+def load_stock_data(ticker, version, interval=DEFAULT_INTERVAL, period=None):
+    bars = stock_cache.get((ticker, interval, version))
+    if bars is None:
+        bars = get_bar_store(interval).compact(ticker)
+        stock_cache.set((ticker, interval, version), bars)
+
+    # The frame is a thin wrapper over (a slice of) the cached arrays. The
+    # interval and the first row are part of the version so every downstream
+    # cache keeps the series apart.
+    first = period_row(bars, period)
+    if first:
+        bars = {key: value[first:] if isinstance(value, np.ndarray) else value for key, value in bars.items()}
+    stock_data = compact_frame(bars)
+    stock_data.attrs['ticker'] = ticker
+    stock_data.attrs['interval'] = interval
+    stock_data.attrs['version'] = (interval,) + tuple(version) + (first,)
+    return stock_data
+
+def get_cached_stock_data(ticker, fallback=None, period=DEFAULT_PERIOD, interval=DEFAULT_INTERVAL):
+    # On failure, returns the fallback ticker's data when one is given and an
+    # empty frame otherwise; callers check attrs['ticker'] and emptiness.
+    # The frame covers `period` plus the indicator warm-up before it.
     try:
-        stock = yf.Ticker(ticker)
-        stock_data = stock.history(period="3y")
-        return stock_data
+        version = get_cached_stock_version(ticker, period, interval)
+        return load_stock_data(ticker, version, interval, period)
     except Exception as e:
-        print(f"Error al obtener la información del ticker {ticker}. {str(e)}")
-        print("Obteniendo información de AAPL (Apple Inc.)...")
-        return get_stock_data("AAPL")
-    
-@lru_cache(maxsize=32)
-def get_cached_stock_data(ticker):
-    return get_stock_data(ticker)
+        logger.warning("stock data unavailable", extra={'ticker': ticker, 'interval': interval, 'fallback': fallback, 'error': str(e)})
+        if fallback is None or fallback == ticker:
+            return pd.DataFrame()
+        return get_cached_stock_data(fallback, None, period, interval)
 
 def get_stock_info(ticker):
     try:
-        stock = yf.Ticker(ticker)
-        stock_info = stock.info
+        if is_unknown_ticker(ticker):
+            raise UnknownTicker(ticker)
+        stock_info = call_upstream('info', lambda: bar_store.provider.info(ticker))
 
         address = stock_info.get('city') + ', ' + stock_info.get('state') + '.' if stock_info.get('city') and stock_info.get('state') else 'No address available'
         description = stock_info.get('longBusinessSummary') or 'No description available'
@@ -79,19 +209,33 @@ def get_stock_info(ticker):
 
         return address, description, name, website
     except Exception as e:
-        print(f"Error al obtener la información del ticker {ticker}. {str(e)}")
-        print("Obteniendo información de AAPL (Apple Inc.)...")
-        return get_stock_info("AAPL")
+        logger.warning("stock info unavailable", extra={'ticker': ticker, 'error': str(e)})
+        raise
     
-@lru_cache(maxsize=32)
+@shared_cached('stock_info')
 def get_cached_stock_info(ticker):
     return get_stock_info(ticker)
 
+def get_last_quote(ticker):
+    # Refreshed through the same cached version as the chart, then read from
+    # the newest stored bar rather than the full history.
+    get_cached_stock_version(ticker)
+    quote = bar_store.last(ticker)
+    if quote is None:
+        raise UnknownTicker(ticker)
+    return quote
+
+def get_stock_overview(ticker):
+    # The profile and the price are independent requests; fetch them together.
+    info = io_pool.submit(get_cached_stock_info, ticker)
+    quote = io_pool.submit(get_last_quote, ticker)
+    return info.result(), quote.result()
+
 def get_most_active_stocks():
-    df = pd.read_html("https://finance.yahoo.com/most-active?offset=0&count=100")
+    df = call_upstream('most_active', lambda: pd.read_html(MOST_ACTIVE_URL))
     return df[0]
 
-@lru_cache(maxsize=32)
+@shared_cached('most_active')
 def get_cached_most_active_stocks():
     return get_most_active_stocks()
     
@@ -0,0 +1,253 @@
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from cache import MemoryCache
+from streaming import IndicatorStream
+
+# Per-worker byte budgets of the indicator service's caches.
+INDICATOR_CACHE_BYTES = int(os.getenv('INDICATOR_CACHE_BYTES', 64 * 1024 * 1024))
+INDICATOR_BARS_BYTES = int(os.getenv('INDICATOR_BARS_BYTES', 32 * 1024 * 1024))
+STREAM_CACHE_BYTES = int(os.getenv('STREAM_CACHE_BYTES', 64 * 1024 * 1024))
+
+# Every indicator takes a mapping of float64 columns ('open', 'high', 'low',
+# 'close', 'volume') shaped (bars,) or (bars, tickers) and returns new arrays.
+# The math mirrors obv_ind, macd_ind, stoch_ind, adl_ind and bbands in functions.py.
+
+
+def _frame(x):
+    return pd.Series(x) if x.ndim == 1 else pd.DataFrame(x)
+
+
+def ewm_mean(x, span, adjust=True):
+    return _frame(x).ewm(span=span, adjust=adjust).mean().to_numpy()
+
+
+def rolling_mean(x, window):
+    return _frame(x).rolling(window=window).mean().to_numpy()
+
+
+def rolling_std(x, window):
+    return _frame(x).rolling(window=window).std().to_numpy()
+
+
+def rolling_max(x, window):
+    return _frame(x).rolling(window=window).max().to_numpy()
+
+
+def rolling_min(x, window):
+    return _frame(x).rolling(window=window).min().to_numpy()
+
+
+def prev(x):
+    shifted = np.empty_like(x)
+    shifted[:1] = np.nan
+    shifted[1:] = x[:-1]
+    return shifted
+
+
+def sign(x):
+    return np.where(x > 0, 1.0, np.where(x < 0, -1.0, 0.0))
+
+
+def divide(a, b):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return a / b
+
+
+def cumsum(x):
+    return _frame(x).cumsum().to_numpy()
+
+
+# Intermediate series are expression nodes: a column name such as 'close', or a
+# tuple (op, *args) whose args are nodes or literal parameters. Equal nodes are
+# the same series, so a Plan evaluates each one once however many indicators
+# refer to it.
+OPS = {
+    'prev': prev,
+    'add': np.add,
+    'sub': np.subtract,
+    'mul': np.multiply,
+    'div': divide,
+    'scale': lambda x, k: x * k,
+    'sign': sign,
+    'cumsum': cumsum,
+    'ema': ewm_mean,
+    'rolling_mean': rolling_mean,
+    'rolling_std': rolling_std,
+    'rolling_max': rolling_max,
+    'rolling_min': rolling_min,
+}
+
+GRAPHS = {}
+
+
+def indicator(name):
+    def decorator(fn):
+        GRAPHS[name] = fn
+        return fn
+    return decorator
+
+
+@indicator('OBV')
+def obv_graph(signal=9):
+    value = ('cumsum', ('mul', ('sign', ('sub', 'close', ('prev', 'close'))), 'volume'))
+    return {'OBV': value, 'OBV Signal': ('ema', value, signal, True)}
+
+
+@indicator('MACD')
+def macd_graph(fast=12, slow=26, signal=9):
+    value = ('sub', ('ema', 'close', fast, False), ('ema', 'close', slow, False))
+    return {'MACD': value, 'Signal': ('ema', value, signal, False)}
+
+
+@indicator('SO')
+def stoch_graph(lookback=14, window_size=3, signal=9):
+    lowest = ('rolling_min', 'low', lookback)
+    k = ('scale', ('div', ('sub', 'close', lowest), ('sub', ('rolling_max', 'high', lookback), lowest)), 100)
+    return {'%K': k, '%D': ('rolling_mean', k, window_size), 'Signal': ('ema', k, signal, True)}
+
+
+@indicator('A/D')
+def adl_graph(signal=9):
+    mfm = ('div', ('sub', ('sub', 'close', 'low'), ('sub', 'high', 'close')), ('sub', 'high', 'low'))
+    value = ('cumsum', ('mul', mfm, 'volume'))
+    return {'A/D': value, 'Signal': ('ema', value, signal, True)}
+
+
+@indicator('BB')
+def bollinger_graph(window_size=10, num_of_std=5):
+    mean = ('rolling_mean', 'close', window_size)
+    width = ('scale', ('rolling_std', 'close', window_size), num_of_std)
+    return {'Middle': mean, 'Upper': ('add', mean, width), 'Lower': ('sub', mean, width)}
+
+
+def _is_node(arg):
+    return isinstance(arg, (str, tuple))
+
+
+class Plan:
+    def __init__(self, bars):
+        self.values = dict(bars)
+        self.evaluated = 0
+
+    def __getitem__(self, node):
+        value = self.values.get(node)
+        if value is None:
+            op, *args = node
+            value = OPS[op](*(self[arg] if _is_node(arg) else arg for arg in args))
+            self.values[node] = value
+            self.evaluated += 1
+        return value
+
+    def compute(self, name, **params):
+        return {output: self[node] for output, node in GRAPHS[name](**params).items()}
+
+
+def _kernel(name):
+    def kernel(bars, **params):
+        return Plan(bars).compute(name, **params)
+    kernel.__name__ = name
+    return kernel
+
+
+INDICATORS = {name: _kernel(name) for name in GRAPHS}
+
+
+def frame_bars(df):
+    return {
+        'open': df['Open'].to_numpy(dtype=np.float64),
+        'high': df['High'].to_numpy(dtype=np.float64),
+        'low': df['Low'].to_numpy(dtype=np.float64),
+        'close': df['Close'].to_numpy(dtype=np.float64),
+        'volume': df['Volume'].to_numpy(dtype=np.float64),
+    }
+
+
+def _freeze(arrays):
+    for array in arrays.values():
+        array.flags.writeable = False
+    return arrays
+
+
+def arrays_nbytes(arrays):
+    return sum(array.nbytes for array in arrays.values())
+
+
+class IndicatorService:
+    # Results, float64 bars and streams are each bounded by bytes. A result
+    # may be a view of a stream's buffers, in which case both count it.
+    def __init__(self, results_bytes=INDICATOR_CACHE_BYTES, bars_bytes=INDICATOR_BARS_BYTES, streams_bytes=STREAM_CACHE_BYTES):
+        self._lock = threading.Lock()
+        self.results = MemoryCache(results_bytes, sizeof=arrays_nbytes)
+        self.bars_cache = MemoryCache(bars_bytes, sizeof=arrays_nbytes)
+        self.streams = MemoryCache(streams_bytes, sizeof=lambda stream: stream.nbytes())
+        self.extended = 0
+        self.evaluated = 0
+
+    def bars(self, ticker, version, df):
+        key = (ticker, version)
+        bars = self.bars_cache.get(key)
+        if bars is None:
+            bars = _freeze(frame_bars(df))
+            self.bars_cache.set(key, bars)
+        return bars
+
+    def compute(self, df, name, **params):
+        return self.compute_many(df, [(name, params)])[0]
+
+    def compute_many(self, df, requests):
+        # requests is a list of (indicator, params). Misses share one Plan, so
+        # intermediates common to several indicators are computed once.
+        ticker = df.attrs.get('ticker')
+        version = df.attrs.get('version')
+        if ticker is None or version is None:
+            plan = Plan(frame_bars(df))
+            return [_freeze(plan.compute(name, **params)) for name, params in requests]
+
+        plan = None
+        results = []
+        for name, params in requests:
+            key = (ticker, version, name, tuple(sorted(params.items())))
+            result = self.results.get(key)
+            if result is not None:
+                results.append(result)
+                continue
+
+            bars = self.bars(ticker, version, df)
+            stream_key = (ticker, df.attrs.get('interval'), name, key[3])
+            result = self._extend(stream_key, bars)
+            if result is None:
+                if plan is None:
+                    plan = Plan(bars)
+                result = plan.compute(name, **params)
+                self.streams.set(stream_key, IndicatorStream(name, params, bars, result))
+
+            result = _freeze(dict(result))
+            self.results.set(key, result)
+            results.append(result)
+
+        if plan is not None:
+            self.evaluated += plan.evaluated
+        return results
+
+    def _extend(self, stream_key, bars):
+        # New bars appended to a series seen before only cost their own
+        # updates. Each stream has its own lock, so different series extend
+        # side by side.
+        stream = self.streams.get(stream_key)
+        if stream is None:
+            return None
+        with stream.lock:
+            result = stream.extend(bars)
+        if result is not None:
+            # Set again so the cache counts the grown buffers.
+            self.streams.set(stream_key, stream)
+            with self._lock:
+                self.extended += 1
+        return result
+
+
+indicator_service = IndicatorService()
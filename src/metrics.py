@@ -0,0 +1,150 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from dash.exceptions import PreventUpdate
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Metrics are per worker process. With PROMETHEUS_MULTIPROC_DIR set the
+# histograms and counters are aggregated across workers; cache statistics
+# are always reported by the worker that serves the scrape.
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30)
+
+CALLBACK_SECONDS = Histogram('finance_callback_seconds', 'Dash callback latency.', ['callback'], buckets=LATENCY_BUCKETS)
+CALLBACK_ERRORS = Counter('finance_callback_errors_total', 'Dash callbacks that raised.', ['callback'])
+PHASE_SECONDS = Histogram('finance_phase_seconds', 'Latency of one phase of a callback.', ['callback', 'phase'], buckets=LATENCY_BUCKETS)
+UPSTREAM_SECONDS = Histogram('finance_upstream_seconds', 'Latency of upstream data-source calls.', ['call'], buckets=LATENCY_BUCKETS)
+UPSTREAM_ERRORS = Counter('finance_upstream_errors_total', 'Failed or rejected upstream calls.', ['call', 'reason'])
+
+# Keys of the stats() dicts that only ever grow; everything else is a gauge.
+COUNTER_KEYS = {'hits', 'misses', 'stale', 'evictions', 'calls', 'merged', 'rejected', 'extended', 'evaluated'}
+
+_current = threading.local()
+
+
+def instrumented(name):
+    # Times a Dash callback; phases inside it are labelled with its name.
+    # PreventUpdate is Dash control flow, not an error.
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            previous = getattr(_current, 'callback', None)
+            _current.callback = name
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except PreventUpdate:
+                raise
+            except Exception:
+                CALLBACK_ERRORS.labels(name).inc()
+                raise
+            finally:
+                CALLBACK_SECONDS.labels(name).observe(time.perf_counter() - start)
+                _current.callback = previous
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def phase(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        collected = getattr(_current, 'collected', None)
+        if collected is not None:
+            collected.append((name, elapsed))
+        else:
+            PHASE_SECONDS.labels(getattr(_current, 'callback', None) or 'background', name).observe(elapsed)
+
+
+@contextmanager
+def collect_phases():
+    # Gathers the phases timed inside as (name, seconds) instead of
+    # observing them, for work done in a process whose metrics nobody
+    # scrapes; the caller hands them to observe_phases.
+    previous = getattr(_current, 'collected', None)
+    _current.collected = collected = []
+    try:
+        yield collected
+    finally:
+        _current.collected = previous
+
+
+def observe_phases(phases):
+    for name, seconds in phases:
+        PHASE_SECONDS.labels(getattr(_current, 'callback', None) or 'background', name).observe(seconds)
+
+
+def observe_upstream(name, fn, rejected=(), not_found=()):
+    # rejected lists exception types that mean the call was never made (an
+    # open circuit), not_found answers without data for the symbol; both are
+    # counted apart from real failures.
+    start = time.perf_counter()
+    try:
+        value = fn()
+    except rejected:
+        UPSTREAM_ERRORS.labels(name, 'rejected').inc()
+        raise
+    except not_found:
+        UPSTREAM_ERRORS.labels(name, 'not_found').inc()
+        UPSTREAM_SECONDS.labels(name).observe(time.perf_counter() - start)
+        raise
+    except Exception:
+        UPSTREAM_ERRORS.labels(name, 'error').inc()
+        UPSTREAM_SECONDS.labels(name).observe(time.perf_counter() - start)
+        raise
+    UPSTREAM_SECONDS.labels(name).observe(time.perf_counter() - start)
+    return value
+
+
+class StatsCollector:
+    # Turns the stats() dicts of caches and breakers into metric families at
+    # scrape time, so the hot paths keep their plain integer counters.
+    def __init__(self):
+        self.sources = {}
+
+    def register(self, name, stats):
+        self.sources[name] = stats
+
+    def collect(self):
+        families = {}
+        for source, stats in self.sources.items():
+            for key, value in stats().items():
+                if key == 'state':
+                    key, value = 'open', int(value != 'closed')
+                if not isinstance(value, (int, float)):
+                    continue
+                family = families.get(key)
+                if family is None:
+                    metric = f'finance_cache_{key}'
+                    if key in COUNTER_KEYS:
+                        family = CounterMetricFamily(metric, f'Cache {key}.', labels=['source'])
+                    else:
+                        family = GaugeMetricFamily(metric, f'Cache {key}.', labels=['source'])
+                    families[key] = family
+                family.add_metric([source], value)
+        return list(families.values())
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def register_stats(name, stats):
+    stats_collector.register(name, stats)
+
+
+def render_metrics():
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        registry.register(stats_collector)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
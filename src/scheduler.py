@@ -0,0 +1,116 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from cache import shared_cache
+from functions import get_most_active_stocks
+
+# How often the scheduler checks the most-active snapshot, and how often
+# browsers poll for changes. The scrape itself only runs once the shared
+# cache entry is older than its TTL (TTL_MOST_ACTIVE).
+MOST_ACTIVE_POLL = int(os.getenv('MOST_ACTIVE_POLL', 60))
+
+MOST_ACTIVE_COLUMNS = {
+    'Symbol': 'Stock',
+    'Price (Intraday)': 'Last',
+    'Change': 'Chg',
+    '% Change': 'Chg%'
+}
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    # Runs registered jobs on one daemon thread; a failing job is logged and
+    # retried on its next turn.
+    def __init__(self):
+        self.jobs = []
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def every(self, seconds, job, name=None):
+        self.jobs.append({'name': name or job.__name__, 'seconds': seconds, 'job': job, 'due': 0.0})
+        return job
+
+    def run_pending(self):
+        now = time.time()
+        for entry in self.jobs:
+            if entry['due'] > now:
+                continue
+            entry['due'] = now + entry['seconds']
+            try:
+                entry['job']()
+            except Exception as e:
+                logger.exception("scheduled job failed", extra={'job': entry['name'], 'error': str(e)})
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_pending()
+            wait = min((entry['due'] for entry in self.jobs), default=time.time() + 1) - time.time()
+            self._stop.wait(max(wait, 0.1))
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, name='scheduler', daemon=True)
+                self._thread.start()
+        return self._thread
+
+    def stop(self):
+        self._stop.set()
+
+
+class MostActiveSnapshot:
+    # The latest most-active rows of this worker. Requests only read it; the
+    # scheduler swaps in new versions. The version is the shared cache's
+    # stored_at, so every worker names the same scrape the same way, and a
+    # few past versions are kept so a browser gets only the changed rows.
+    def __init__(self, history=8):
+        self.version = None
+        self.rows = []
+        self._history = OrderedDict()
+        self._size = history
+        self._lock = threading.Lock()
+
+    def update(self, table, stored_at):
+        with self._lock:
+            if stored_at == self.version:
+                return False
+
+        rows = table[list(MOST_ACTIVE_COLUMNS)].rename(columns=MOST_ACTIVE_COLUMNS).to_dict('records')
+        with self._lock:
+            self.version = stored_at
+            self.rows = rows
+            self._history[stored_at] = rows
+            while len(self._history) > self._size:
+                self._history.popitem(last=False)
+        return True
+
+    def refresh(self):
+        # Goes through the shared cache so only one worker scrapes per TTL.
+        entry = shared_cache.refresh('most_active', repr(()), get_most_active_stocks)
+        if entry is not None:
+            self.update(*entry)
+
+    def symbols(self):
+        with self._lock:
+            return [row['Stock'] for row in self.rows]
+
+    def changes(self, since):
+        # (version, rows) for a full table, (version, {index: row}) for a diff
+        # against a version the client already has, or None when up to date.
+        with self._lock:
+            if self.version is None or since == self.version:
+                return None
+            previous = self._history.get(since)
+            if previous is None or len(previous) != len(self.rows):
+                return self.version, list(self.rows)
+            return self.version, {i: row for i, row in enumerate(self.rows) if row != previous[i]}
+
+
+scheduler = Scheduler()
+most_active = MostActiveSnapshot()
+scheduler.every(MOST_ACTIVE_POLL, most_active.refresh, name='most_active')
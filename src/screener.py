@@ -0,0 +1,121 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from cache import MemoryCache
+from functions import get_cached_stock_data
+from indicators import INDICATORS
+from scheduler import most_active
+
+WATCHLIST_FILE = os.getenv('WATCHLIST_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'watchlist.txt'))
+
+FIELDS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+SCREENER_CACHE_BYTES = int(os.getenv('SCREENER_CACHE_BYTES', 64 * 1024 * 1024))
+
+
+def panel_nbytes(panel):
+    return panel['dates'].nbytes + sum(values.nbytes for values in panel['bars'].values())
+
+
+# Aligned (dates, tickers) panels of recent screens, bounded by bytes.
+panel_cache = MemoryCache(SCREENER_CACHE_BYTES, sizeof=panel_nbytes)
+
+
+def load_watchlist(path=WATCHLIST_FILE):
+    try:
+        with open(path) as f:
+            lines = [line.split('#')[0].strip().upper() for line in f]
+    except OSError:
+        return []
+    return [line for line in lines if line]
+
+
+def screener_tickers(source):
+    if source == 'watchlist':
+        return load_watchlist()
+    return most_active.symbols()
+
+
+def _load_frames(tickers):
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        frames = list(pool.map(get_cached_stock_data, tickers))
+
+    # get_cached_stock_data falls back to AAPL on errors; keep only real matches.
+    return [
+        (ticker, frame) for ticker, frame in zip(tickers, frames)
+        if not frame.empty and frame.attrs.get('ticker', ticker) == ticker
+    ]
+
+
+def build_panel(tickers):
+    loaded = _load_frames(tickers)
+    key = tuple((ticker, frame.attrs.get('version')) for ticker, frame in loaded)
+    panel = panel_cache.get(key)
+    if panel is not None:
+        return panel
+
+    stamps = [frame.index.asi8 for _, frame in loaded]
+    dates = np.unique(np.concatenate(stamps)) if stamps else np.empty(0, dtype=np.int64)
+    bars = {field: np.full((len(dates), len(loaded)), np.nan) for field in FIELDS}
+    for j, ((_, frame), ts) in enumerate(zip(loaded, stamps)):
+        rows = np.searchsorted(dates, ts)
+        for field, column in FIELDS.items():
+            bars[field][rows, j] = frame[column].to_numpy(dtype=np.float64)
+
+    panel = {'tickers': [ticker for ticker, _ in loaded], 'dates': dates, 'bars': bars}
+    panel_cache.set(key, panel)
+    return panel
+
+
+def _last_valid(values):
+    # Last non-NaN row of every column of a (dates, tickers) array.
+    valid = ~np.isnan(values)
+    idx = len(values) - 1 - np.argmax(valid[::-1], axis=0)
+    out = values[idx, np.arange(values.shape[1])]
+    out[~valid.any(axis=0)] = np.nan
+    return out
+
+
+def _last_cross(fast, slow, lookback):
+    # Bars since the most recent sign change of fast - slow within the lookback, or -1.
+    side = np.sign(fast - slow)
+    with np.errstate(invalid='ignore'):
+        crossed = (side[1:] * side[:-1]) < 0
+    recent = crossed[-lookback:][::-1]
+    bars_ago = np.where(recent.any(axis=0), np.argmax(recent, axis=0), -1)
+    return bars_ago, _last_valid(side)
+
+
+def screen(panel, lookback=5, window_size=10, num_of_std=2, so_lookback=14, so_smoothing=3):
+    bars = panel['bars']
+    if not panel['tickers'] or len(panel['dates']) < 2:
+        return pd.DataFrame()
+
+    close = bars['close']
+    macd = INDICATORS['MACD'](bars)
+    so = INDICATORS['SO'](bars, lookback=so_lookback, window_size=so_smoothing)
+    obv = INDICATORS['OBV'](bars)
+    adl = INDICATORS['A/D'](bars)
+    bb = INDICATORS['BB'](bars, window_size=window_size, num_of_std=num_of_std)
+
+    lookback = max(1, min(lookback, len(close) - 1))
+    macd_ago, macd_side = _last_cross(macd['MACD'], macd['Signal'], lookback)
+    last = _last_valid(close)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = (last / _last_valid(close[:-lookback]) - 1) * 100
+        percent_b = (last - _last_valid(bb['Lower'])) / (_last_valid(bb['Upper']) - _last_valid(bb['Lower']))
+
+    return pd.DataFrame({
+        'Stock': panel['tickers'],
+        'Last': np.round(last, 2),
+        'Chg%': np.round(change, 2),
+        'MACD Cross': np.where(macd_ago < 0, '', np.where(macd_side > 0, 'Bullish', 'Bearish')),
+        'Bars Ago': np.where(macd_ago < 0, np.nan, macd_ago),
+        '%K': np.round(_last_valid(so['%K']), 1),
+        '%B': np.round(percent_b, 2),
+        'OBV Trend': np.where(_last_valid(obv['OBV']) > _last_valid(obv['OBV Signal']), 'Up', 'Down'),
+        'A/D Trend': np.where(_last_valid(adl['A/D']) > _last_valid(adl['Signal']), 'Up', 'Down'),
+    })
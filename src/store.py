@@ -0,0 +1,439 @@
+import json
+import os
+import re
+from contextlib import contextmanager
+from urllib.error import HTTPError
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen
+
+import numpy as np
+import pandas as pd
+import yfinance as yf
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Base URL of a server speaking the Yahoo chart and quoteSummary APIs, such
+# as the stand-in in benchmarks/yahoo_stub.py. Unset, yfinance is used.
+YAHOO_URL = os.getenv('YAHOO_URL')
+YAHOO_TIMEOUT = float(os.getenv('YAHOO_TIMEOUT', 10))
+
+STORE_DIR = os.getenv('STORE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'bars'))
+
+BAR_DTYPE = np.dtype([
+    ('ts', '<i8'),
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+    ('volume', '<i8'),
+])
+
+COLUMNS = {'open': 'Open', 'high': 'High', 'low': 'Low', 'close': 'Close', 'volume': 'Volume'}
+
+PRICE_FIELDS = ('open', 'high', 'low', 'close')
+
+# Prices are held as float32 in memory when that keeps them within this
+# distance of the stored value (half a cent by default).
+PRICE_TOLERANCE = float(os.getenv('PRICE_TOLERANCE', 0.005))
+
+
+DEFAULT_PERIOD = '3y'
+DEFAULT_INTERVAL = '1d'
+
+# Intraday limits of the Yahoo chart API, in days: the longest range one
+# request may span and how far back bars are available at all. Daily and
+# longer intervals have neither and are fetched in a single request.
+INTERVAL_LIMITS = {
+    '1m': (7, 30),
+    '2m': (60, 60),
+    '5m': (60, 60),
+    '15m': (60, 60),
+    '30m': (60, 60),
+    '60m': (730, 730),
+    '90m': (60, 60),
+    '1h': (730, 730),
+}
+
+INTERVALS = tuple(INTERVAL_LIMITS) + ('1d', '5d', '1wk', '1mo', '3mo')
+
+# Days of intraday bars kept in the store; never less than the upstream
+# serves, or every refresh would fetch the dropped bars again.
+INTRADAY_RETENTION_DAYS = int(os.getenv('INTRADAY_RETENTION_DAYS', 0))
+
+class NotFound(Exception):
+    # The upstream answered, but has nothing for the symbol.
+    pass
+
+
+class InvalidRequest(ValueError):
+    # A ticker, period or interval rejected before asking the upstream.
+    pass
+
+
+_PERIOD = re.compile(r'^(\d+)(d|wk|mo|y)$')
+_PERIOD_UNITS = {'d': 'days', 'wk': 'weeks', 'mo': 'months', 'y': 'years'}
+
+
+def period_start(period, now=None):
+    # Start of a yfinance-style period ('5d', '6mo', '3y', 'ytd'); None for 'max'.
+    now = now if now is not None else pd.Timestamp.now(tz='UTC')
+    if period in (None, 'max'):
+        return None
+    if period == 'ytd':
+        return now.normalize().replace(month=1, day=1)
+    match = _PERIOD.match(period)
+    if match is None:
+        raise InvalidRequest(f"Invalid period: {period!r}")
+    return now - pd.DateOffset(**{_PERIOD_UNITS[match.group(2)]: int(match.group(1))})
+
+
+class Provider:
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        raise NotImplementedError
+
+    def info(self, ticker):
+        raise NotImplementedError
+
+
+class YahooProvider(Provider):
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        stock = yf.Ticker(ticker)
+        if start is not None:
+            return stock.history(start=start, end=end, interval=interval)
+        return stock.history(period=period, interval=interval)
+
+    def info(self, ticker):
+        # yfinance gives a near-empty dict for a symbol Yahoo does not know.
+        info = yf.Ticker(ticker).info
+        if not info or not (info.get('shortName') or info.get('longName') or info.get('quoteType')):
+            raise NotFound(f"No information for {ticker}")
+        return info
+
+
+class ChartProvider(Provider):
+    # Reads the chart and quoteSummary endpoints directly. yfinance always
+    # goes to the Yahoo hosts, so this is how the app is pointed at another
+    # server; a missing symbol gives an empty frame, like yfinance.
+    def __init__(self, base_url, timeout=YAHOO_TIMEOUT):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, path, **params):
+        url = f'{self.base_url}{path}?{urlencode(params)}'
+        try:
+            with urlopen(url, timeout=self.timeout) as response:
+                return json.load(response)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def history(self, ticker, period=None, start=None, end=None, interval='1d'):
+        params = {'interval': interval, 'includePrePost': 'false', 'events': 'div,splits'}
+        if start is not None:
+            params['period1'] = int(pd.Timestamp(start).timestamp())
+            params['period2'] = int(pd.Timestamp(end if end is not None else pd.Timestamp.now(tz='UTC')).timestamp())
+        else:
+            params['range'] = period or 'max'
+
+        body = self._get(f'/v8/finance/chart/{quote(ticker)}', **params)
+        result = (body or {}).get('chart', {}).get('result') or []
+        if not result or not result[0].get('timestamp'):
+            return pd.DataFrame()
+
+        result = result[0]
+        bars = result['indicators']['quote'][0]
+        index = pd.to_datetime(result['timestamp'], unit='s', utc=True).tz_convert(result['meta'].get('exchangeTimezoneName') or 'UTC')
+        if interval not in INTERVAL_LIMITS:
+            index = index.normalize()
+        index.name = 'Date'
+        df = pd.DataFrame({column: np.asarray(bars[field], dtype=np.float64) for field, column in COLUMNS.items()}, index=index)
+        df = df.dropna(subset=['Close'])
+        df['Volume'] = df['Volume'].fillna(0).astype(np.int64)
+        df = df[~df.index.duplicated(keep='last')].copy()
+
+        # Events go on the bar they fall in, like the yfinance action columns.
+        events = result.get('events') or {}
+        for kind, column in (('dividends', 'Dividends'), ('splits', 'Stock Splits')):
+            df[column] = 0.0
+            for event in events.get(kind, {}).values():
+                at = df.index.searchsorted(pd.Timestamp(event['date'], unit='s', tz='UTC'), side='right') - 1
+                if at >= 0:
+                    amount = event['amount'] if kind == 'dividends' else event['numerator'] / event['denominator']
+                    df.iloc[at, df.columns.get_loc(column)] = amount
+        return df
+
+    def info(self, ticker):
+        body = self._get(f'/v10/finance/quoteSummary/{quote(ticker)}', modules='assetProfile,price')
+        result = (body or {}).get('quoteSummary', {}).get('result') or []
+        if not result:
+            raise NotFound(f"No information for {ticker}")
+        info = {}
+        for module in result[0].values():
+            info.update({key: value for key, value in module.items() if not isinstance(value, dict)})
+        return info
+
+
+def default_provider():
+    return ChartProvider(YAHOO_URL) if YAHOO_URL else YahooProvider()
+
+
+def compact_bars(bars, tz):
+    # Only the used columns, epoch nanoseconds instead of a tz-aware index
+    # and float32 prices whenever they stay within PRICE_TOLERANCE.
+    prices = np.column_stack([bars[field] for field in PRICE_FIELDS]) if len(bars) else np.empty((0, 4))
+    finite = np.abs(prices[np.isfinite(prices)])
+    largest = finite.max() if len(finite) else 0.0
+    dtype = np.float32 if largest * np.finfo(np.float32).eps <= PRICE_TOLERANCE else np.float64
+
+    compact = {'ts': np.array(bars['ts'], dtype=np.int64), 'tz': tz, 'volume': np.array(bars['volume'], dtype=np.int64)}
+    for field in PRICE_FIELDS:
+        compact[field] = np.array(bars[field], dtype=dtype)
+
+    # Frames built from it share these arrays, so nobody may write to them.
+    for value in compact.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return compact
+
+
+def compact_nbytes(compact):
+    return sum(value.nbytes for value in compact.values() if isinstance(value, np.ndarray))
+
+
+def compact_frame(compact):
+    index = pd.DatetimeIndex(pd.to_datetime(compact['ts'], unit='ns', utc=True)).tz_convert(compact['tz'])
+    index.name = 'Date'
+    return pd.DataFrame({column: compact[field] for field, column in COLUMNS.items()}, index=index, copy=False)
+
+
+def event_times(df):
+    # Timestamps of the bars that carry a dividend or a split.
+    flags = np.zeros(len(df), dtype=bool)
+    for column in ('Dividends', 'Stock Splits'):
+        if column in df:
+            flags |= df[column].fillna(0).to_numpy() != 0
+    return to_records(df[flags])['ts']
+
+
+def to_records(df):
+    records = np.empty(len(df), dtype=BAR_DTYPE)
+    if df.empty:
+        return records
+
+    index = df.index
+    if index.tz is None:
+        index = index.tz_localize('UTC')
+    records['ts'] = index.tz_convert('UTC').as_unit('ns').asi8
+    for field, column in COLUMNS.items():
+        records[field] = df[column].to_numpy()
+
+    return records
+
+
+class BarStore:
+    def __init__(self, provider=None, root=STORE_DIR, interval=DEFAULT_INTERVAL):
+        if interval not in INTERVALS:
+            raise InvalidRequest(f"Invalid interval: {interval!r}")
+        self.provider = provider or default_provider()
+        self.root = root
+        self.interval = interval
+
+    def _path(self, ticker):
+        if not ticker or '/' in ticker or '\\' in ticker or ticker.startswith('.'):
+            raise InvalidRequest(f"Invalid ticker: {ticker!r}")
+        return os.path.join(self.root, self.interval, f'{ticker}.bin')
+
+    @contextmanager
+    def _lock(self, ticker):
+        path = self._path(ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + '.lock', 'w') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_meta(self, ticker):
+        try:
+            with open(self._path(ticker) + '.json') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_meta(self, ticker, meta):
+        path = self._path(ticker) + '.json'
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+
+    def read(self, ticker):
+        # Appends only ever grow the file and rewrites swap in a new inode,
+        # so a mapping taken here stays valid for as long as it is referenced.
+        path = self._path(ticker)
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            return np.empty(0, dtype=BAR_DTYPE)
+
+        rows = size // BAR_DTYPE.itemsize
+        if rows == 0:
+            return np.empty(0, dtype=BAR_DTYPE)
+        return np.memmap(path, dtype=BAR_DTYPE, mode='r', shape=(rows,))
+
+    def version(self, ticker):
+        # Rows, newest timestamp and the revision every write bumps, so a
+        # rewritten last bar gives a new version too. The meta is read first:
+        # writers update it after the bars, so the bars read here are never
+        # older than the revision.
+        revision = self._read_meta(ticker).get('revision', 0)
+        bars = self.read(ticker)
+        if len(bars) == 0:
+            return (0, 0, 0)
+        return (len(bars), int(bars['ts'][-1]), revision)
+
+    def last(self, ticker):
+        # (timestamp, close) of the newest bar without building a frame.
+        bars = self.read(ticker)
+        if len(bars) == 0:
+            return None
+        tz = self._read_meta(ticker).get('tz') or 'UTC'
+        return pd.Timestamp(int(bars['ts'][-1]), unit='ns', tz='UTC').tz_convert(tz), float(bars['close'][-1])
+
+    def compact(self, ticker):
+        return compact_bars(self.read(ticker), self._read_meta(ticker).get('tz') or 'UTC')
+
+    def _earliest(self):
+        limits = INTERVAL_LIMITS.get(self.interval)
+        if limits is None:
+            return None
+        # An hour of slack keeps the first chunk inside the upstream window.
+        return pd.Timestamp.now(tz='UTC') - pd.Timedelta(days=limits[1]) + pd.Timedelta(hours=1)
+
+    def _history(self, ticker, start, end=None):
+        # Daily and longer bars come in one request. Intraday ranges are split
+        # into chunks the upstream accepts and stitched back together.
+        limits = INTERVAL_LIMITS.get(self.interval)
+        if limits is None:
+            if start is None:
+                return self.provider.history(ticker, period='max', interval=self.interval)
+            return self.provider.history(ticker, start=start.to_pydatetime(), end=None if end is None else end.to_pydatetime(), interval=self.interval)
+
+        end = pd.Timestamp.now(tz='UTC') if end is None else end
+        chunk = pd.Timedelta(days=limits[0])
+        frames = []
+        while start < end:
+            stop = min(start + chunk, end)
+            df = self.provider.history(ticker, start=start.to_pydatetime(), end=stop.to_pydatetime(), interval=self.interval)
+            if not df.empty:
+                frames.append(df)
+            start = stop
+
+        if not frames:
+            return pd.DataFrame()
+        df = pd.concat(frames)
+        return df[~df.index.duplicated(keep='last')].sort_index()
+
+    def refresh(self, ticker, period=DEFAULT_PERIOD):
+        # Keeps the stored series covering at least `period`: the first call
+        # fetches it, a longer period backfills older bars and every call
+        # appends the bars that arrived since the last one.
+        with self._lock(ticker):
+            bars = self.read(ticker)
+            meta = self._read_meta(ticker)
+
+            want = period_start(period)
+            earliest = self._earliest()
+            if earliest is not None:
+                want = earliest if want is None else max(want, earliest)
+            covered = meta.get('start', int(bars['ts'][0]) if len(bars) else None)
+
+            if len(bars) == 0 or (covered != 'max' and (want is None or want.value < covered)):
+                first = pd.Timestamp(int(bars['ts'][0]), unit='ns', tz='UTC') if len(bars) else None
+                df = self._history(ticker, want, first)
+                if len(bars) == 0 and df.empty:
+                    return self.version(ticker)
+
+                older = to_records(df)
+                if len(bars):
+                    older = np.concatenate([older[older['ts'] < bars['ts'][0]], bars])
+                tz = df.index.tz if not df.empty else meta.get('tz')
+                self._rewrite(ticker, older, tz, start='max' if want is None else want.value)
+                if len(bars) == 0:
+                    return self.version(ticker)
+                bars = self.read(ticker)
+                meta = self._read_meta(ticker)
+
+            bars = self._trim(ticker, bars, meta)
+            last_ts = int(bars['ts'][-1])
+            start = pd.Timestamp(last_ts, unit='ns', tz='UTC').tz_convert(meta.get('tz') or 'UTC')
+            df = self._history(ticker, start)
+
+            # Prices are split and dividend adjusted, so an event newer than
+            # the ones already applied rescales every stored bar before it.
+            events = event_times(df)
+            if len(events) and events.max() > meta.get('adjusted', last_ts - 1):
+                return self._readjust(ticker, bars, int(events.max()))
+
+            new = to_records(df)
+            new = new[new['ts'] >= last_ts]
+            if len(new) == 0:
+                return self.version(ticker)
+
+            if new['ts'][0] == last_ts:
+                if new[0] == bars[-1]:
+                    new = new[1:]
+                else:
+                    # The last stored bar was still forming; swap in the revised one.
+                    self._rewrite(ticker, np.concatenate([bars[:-1], new]), df.index.tz)
+                    return self.version(ticker)
+
+            if len(new):
+                with open(self._path(ticker), 'ab') as f:
+                    f.write(new.tobytes())
+                meta = self._read_meta(ticker)
+                self._write_meta(ticker, {**meta, 'revision': meta.get('revision', 0) + 1})
+
+            return self.version(ticker)
+
+    def _trim(self, ticker, bars, meta):
+        # Drops intraday bars past the retention once they add up to a
+        # quarter of it, so the file is not rewritten on every refresh.
+        limits = INTERVAL_LIMITS.get(self.interval)
+        if limits is None:
+            return bars
+        retention = pd.Timedelta(days=max(INTRADAY_RETENTION_DAYS, limits[1]))
+        cutoff = (pd.Timestamp.now(tz='UTC') - retention).value
+        if bars['ts'][0] >= cutoff - (retention / 4).value or bars['ts'][-1] < cutoff:
+            return bars
+
+        self._rewrite(ticker, bars[bars['ts'] >= cutoff], meta.get('tz'), start=cutoff)
+        return self.read(ticker)
+
+    def _readjust(self, ticker, bars, adjusted):
+        # Fetches the stored range again, as far back as the upstream serves
+        # it; older bars are kept as they are.
+        first = pd.Timestamp(int(bars['ts'][0]), unit='ns', tz='UTC')
+        earliest = self._earliest()
+        df = self._history(ticker, first if earliest is None else max(first, earliest))
+        if df.empty:
+            return self.version(ticker)
+
+        records = to_records(df)
+        records = np.concatenate([bars[bars['ts'] < records['ts'][0]], records])
+        self._rewrite(ticker, records, df.index.tz, adjusted=adjusted)
+        return self.version(ticker)
+
+    def _rewrite(self, ticker, records, tz, **meta):
+        path = self._path(ticker)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(np.ascontiguousarray(records, dtype=BAR_DTYPE).tobytes())
+        os.replace(path + '.tmp', path)
+        old = self._read_meta(ticker)
+        self._write_meta(ticker, {**old, **meta, 'tz': str(tz) if tz is not None else 'UTC', 'revision': old.get('revision', 0) + 1})
@@ -0,0 +1,372 @@
+import copy
+import math
+import threading
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+# Incremental counterparts of the kernels in indicators.py. Each state keeps
+# just enough history (running EMA weights, cumulative sums, window buffers)
+# to turn one new bar into the next output value, and follows the pandas
+# conventions the batch kernels inherit: +-inf is treated as missing by ewm
+# and rolling, cumulative sums skip missing values.
+#
+# seed(..., end) puts a state where it would be after the first `end` bars,
+# read off the batch result instead of replaying every bar: EMAs take the
+# last output and a closed-form weight, sums the last total, and windows
+# replay only their last `window` values.
+
+NAN = float('nan')
+
+
+def _missing(x):
+    return not math.isfinite(x)
+
+
+class EMA:
+    def __init__(self, span, adjust=True):
+        self.alpha = 2.0 / (span + 1.0)
+        self.adjust = adjust
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.started = False
+
+    def update(self, x):
+        if _missing(x):
+            x = NAN
+        new_wt = 1.0 if self.adjust else self.alpha
+
+        if not self.started:
+            self.started = True
+            self.weighted = x
+            return self.weighted
+
+        if self.weighted == self.weighted:
+            self.old_wt *= 1.0 - self.alpha
+            if x == x:
+                if self.weighted != x:
+                    self.weighted = ((self.old_wt * self.weighted) + (new_wt * x)) / (self.old_wt + new_wt)
+                if self.adjust:
+                    self.old_wt += new_wt
+                else:
+                    self.old_wt = 1.0
+        elif x == x:
+            self.weighted = x
+
+        return self.weighted
+
+    def seed(self, inputs, outputs, end):
+        # The weight decays by 1 - alpha per bar and gains new_wt per valid
+        # input, so it is a sum of powers over the valid positions (only the
+        # last one without adjust). Powers past the horizon underflow to
+        # zero; before any valid input the weight is still 1.
+        if end:
+            self.started = True
+            self.weighted = float(outputs[end - 1])
+            if self.weighted == self.weighted:
+                horizon = min(end, int(-750 / math.log1p(-self.alpha)) + 1)
+                valid = np.flatnonzero(np.isfinite(inputs[end - horizon:end]))
+                decay = (1.0 - self.alpha) ** (horizon - 1 - valid).astype(np.float64)
+                self.old_wt = float(decay.sum()) if self.adjust else float(decay[-1]) if len(valid) else 0.0
+        return self
+
+
+class CumSum:
+    def __init__(self):
+        self.total = 0.0
+
+    def update(self, x):
+        if x != x:
+            return NAN
+        self.total += x
+        return self.total
+
+    def seed(self, outputs, end):
+        # Missing inputs give NaN outputs, so the total is the last other one.
+        known = np.flatnonzero(~np.isnan(outputs[:end]))
+        self.total = float(outputs[known[-1]]) if len(known) else 0.0
+        return self
+
+
+class RollingWindow:
+    def __init__(self, window):
+        self.window = window
+        self.values = deque(maxlen=window)
+
+    def update(self, x):
+        self.values.append(NAN if _missing(x) else x)
+        return self
+
+    def seed(self, values, end):
+        for x in values[max(0, end - self.window):end]:
+            self.update(float(x))
+        return self
+
+    def full(self):
+        return len(self.values) == self.window and not any(v != v for v in self.values)
+
+    def mean(self):
+        if not self.full():
+            return NAN
+        return math.fsum(self.values) / self.window
+
+    def std(self):
+        if not self.full() or self.window < 2:
+            return NAN
+        return float(np.std(np.fromiter(self.values, dtype=np.float64, count=self.window), ddof=1))
+
+
+class RollingExtreme:
+    # Monotonic deque of (position, value): the front is always the window's
+    # extreme, and every value is pushed and popped at most once.
+    def __init__(self, window, largest=True):
+        self.window = window
+        self.largest = largest
+        self.candidates = deque()
+        self.missing = deque()
+        self.missing_count = 0
+        self.position = 0
+
+    def update(self, x):
+        position = self.position
+        self.position += 1
+
+        is_missing = _missing(x)
+        self.missing.append(is_missing)
+        self.missing_count += is_missing
+        if len(self.missing) > self.window:
+            self.missing_count -= self.missing.popleft()
+
+        if not is_missing:
+            while self.candidates and (self.candidates[-1][1] <= x if self.largest else self.candidates[-1][1] >= x):
+                self.candidates.pop()
+            self.candidates.append((position, x))
+        while self.candidates and self.candidates[0][0] <= position - self.window:
+            self.candidates.popleft()
+
+        if self.position < self.window or self.missing_count:
+            return NAN
+        return self.candidates[0][1]
+
+    def seed(self, values, end):
+        # Positions stay absolute, so only the window itself is replayed.
+        self.position = max(0, end - self.window)
+        for x in values[self.position:end]:
+            self.update(float(x))
+        return self
+
+
+class OBVState:
+    def __init__(self, signal=9):
+        self.close_prev = NAN
+        self.total = CumSum()
+        self.signal = EMA(signal)
+
+    def update(self, bar):
+        close = bar['close']
+        if close > self.close_prev:
+            direction = 1.0
+        elif close < self.close_prev:
+            direction = -1.0
+        else:
+            direction = 0.0
+        self.close_prev = close
+
+        value = self.total.update(direction * bar['volume'])
+        return {'OBV': value, 'OBV Signal': self.signal.update(value)}
+
+    def seed(self, bars, result, end):
+        if end:
+            self.close_prev = float(bars['close'][end - 1])
+        self.total.seed(result['OBV'], end)
+        self.signal.seed(result['OBV'], result['OBV Signal'], end)
+        return self
+
+
+class MACDState:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = EMA(fast, adjust=False)
+        self.slow = EMA(slow, adjust=False)
+        self.signal = EMA(signal, adjust=False)
+
+    def update(self, bar):
+        value = self.fast.update(bar['close']) - self.slow.update(bar['close'])
+        return {'MACD': value, 'Signal': self.signal.update(value)}
+
+    def seed(self, bars, result, end):
+        # The result only has their difference, so the two averages of the
+        # close are computed again, still in one vectorized pass each.
+        close = pd.Series(bars['close'][:end], dtype=np.float64)
+        for ema in (self.fast, self.slow):
+            ema.seed(bars['close'], close.ewm(alpha=ema.alpha, adjust=False).mean().to_numpy(), end)
+        self.signal.seed(result['MACD'], result['Signal'], end)
+        return self
+
+
+class StochState:
+    def __init__(self, lookback=14, window_size=3, signal=9):
+        self.highest = RollingExtreme(lookback, largest=True)
+        self.lowest = RollingExtreme(lookback, largest=False)
+        self.window = RollingWindow(window_size)
+        self.signal = EMA(signal)
+
+    def update(self, bar):
+        highest = self.highest.update(bar['high'])
+        lowest = self.lowest.update(bar['low'])
+        with np.errstate(divide='ignore', invalid='ignore'):
+            k = float(np.float64(bar['close'] - lowest) / np.float64(highest - lowest) * 100)
+        return {'%K': k, '%D': self.window.update(k).mean(), 'Signal': self.signal.update(k)}
+
+    def seed(self, bars, result, end):
+        self.highest.seed(bars['high'], end)
+        self.lowest.seed(bars['low'], end)
+        self.window.seed(result['%K'], end)
+        self.signal.seed(result['%K'], result['Signal'], end)
+        return self
+
+
+class ADLState:
+    def __init__(self, signal=9):
+        self.total = CumSum()
+        self.signal = EMA(signal)
+
+    def update(self, bar):
+        high, low, close = bar['high'], bar['low'], bar['close']
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mfm = float(np.float64((close - low) - (high - close)) / np.float64(high - low))
+        value = self.total.update(mfm * bar['volume'])
+        return {'A/D': value, 'Signal': self.signal.update(value)}
+
+    def seed(self, bars, result, end):
+        self.total.seed(result['A/D'], end)
+        self.signal.seed(result['A/D'], result['Signal'], end)
+        return self
+
+
+class BollingerState:
+    def __init__(self, window_size=10, num_of_std=5):
+        self.window = RollingWindow(window_size)
+        self.num_of_std = num_of_std
+
+    def update(self, bar):
+        self.window.update(bar['close'])
+        mean = self.window.mean()
+        std = self.window.std()
+        return {'Middle': mean, 'Upper': mean + std * self.num_of_std, 'Lower': mean - std * self.num_of_std}
+
+    def seed(self, bars, result, end):
+        self.window.seed(bars['close'], end)
+        return self
+
+
+STATES = {
+    'OBV': OBVState,
+    'MACD': MACDState,
+    'SO': StochState,
+    'A/D': ADLState,
+    'BB': BollingerState,
+}
+
+
+class StreamingEngine:
+    def __init__(self, indicators):
+        # indicators maps a name from STATES to its keyword parameters.
+        self.states = {name: STATES[name](**params) for name, params in indicators.items()}
+        self.latest = {}
+
+    def update(self, bar):
+        self.latest = {name: state.update(bar) for name, state in self.states.items()}
+        return self.latest
+
+    def run(self, bars):
+        # Replays a mapping of column arrays, returning the same shape of
+        # output as the batch kernels; used to warm up and to check parity.
+        n = len(bars['close'])
+        out = {}
+        for i in range(n):
+            latest = self.update({field: float(values[i]) for field, values in bars.items()})
+            for name, values in latest.items():
+                columns = out.setdefault(name, {key: np.empty(n) for key in values})
+                for key, value in values.items():
+                    columns[key][i] = value
+        return out
+
+
+# A stream only extends when the new bars are at most this share of the
+# series: an update costs a few microseconds per bar in Python, the batch
+# kernels a fraction of one, so past that recomputing is cheaper.
+STREAM_SHARE = 1 / 32
+
+
+def _row(bars, i):
+    return {field: float(values[i]) for field, values in bars.items()}
+
+
+class IndicatorStream:
+    # Extends one indicator's batch result as bars are appended. The state
+    # before the newest bar is kept so a revised last bar can be redone.
+    # Results are views of buffers with room to grow: appends write past
+    # the end in place, while a revision copies them, since results handed
+    # out earlier share the revised position.
+    def __init__(self, name, params, bars, result):
+        self.name = name
+        self.params = params
+        self.lock = threading.Lock()
+        self.rows = len(bars['close'])
+        self.first_bar = _row(bars, 0) if self.rows else None
+        self.last_bar = _row(bars, self.rows - 1) if self.rows else None
+        self.result = result
+        self.buffers = None
+        self.state = None
+        self.before_last = None
+
+    def _seed(self, bars):
+        self.before_last = STATES[self.name](**self.params).seed(bars, self.result, self.rows - 1)
+        self.state = copy.deepcopy(self.before_last)
+        self.state.update(_row(bars, self.rows - 1))
+
+    def _reserve(self, start, n):
+        capacity = len(next(iter(self.buffers.values()))) if self.buffers else 0
+        if start < self.rows or n > capacity:
+            capacity = max(n, capacity + capacity // 4 + 16)
+            buffers = {}
+            for key, values in self.result.items():
+                buffers[key] = np.empty(capacity)
+                buffers[key][:start] = values[:start]
+            self.buffers = buffers
+
+    def nbytes(self):
+        return sum(values.nbytes for values in (self.buffers or self.result).values())
+
+    def extend(self, bars):
+        # Returns None when the new bars do not continue the known series,
+        # or when there are too many of them to be worth streaming.
+        n = len(bars['close'])
+        if not self.rows or n < self.rows or _row(bars, 0) != self.first_bar:
+            return None
+
+        start = self.rows
+        if _row(bars, self.rows - 1) != self.last_bar:
+            start = self.rows - 1
+        if n - start > max(1, n * STREAM_SHARE):
+            return None
+        if n == self.rows and start == self.rows:
+            return self.result
+
+        if self.state is None:
+            self._seed(bars)
+        if start < self.rows:
+            self.state = copy.deepcopy(self.before_last)
+
+        self._reserve(start, n)
+        for i in range(start, n):
+            if i == n - 1:
+                self.before_last = copy.deepcopy(self.state)
+            for key, value in self.state.update(_row(bars, i)).items():
+                self.buffers[key][i] = value
+
+        self.result = {key: buffer[:n] for key, buffer in self.buffers.items()}
+        self.rows = n
+        self.last_bar = _row(bars, n - 1)
+        return self.result
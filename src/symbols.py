@@ -0,0 +1,145 @@
+import csv
+import os
+import re
+import threading
+
+SYMBOLS_FILE = os.getenv('SYMBOLS_FILE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'symbols.csv'))
+
+SUGGESTION_LIMIT = int(os.getenv('SUGGESTION_LIMIT', 10))
+
+# Ids kept per trie node; the file lists symbols by popularity, so the first
+# ids to reach a node are the ones worth suggesting.
+NODE_CAPACITY = 32
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+
+def load_symbols(path=SYMBOLS_FILE):
+    # (symbol, name) pairs from a CSV with Symbol and Name columns.
+    try:
+        with open(path, newline='') as f:
+            return [
+                (row['Symbol'].strip().upper(), (row.get('Name') or '').strip())
+                for row in csv.DictReader(f) if row.get('Symbol')
+            ]
+    except OSError:
+        return []
+
+
+def _trigrams(text):
+    text = f'  {text} '
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _Trie:
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, id_):
+        node = self.root
+        for char in key:
+            node = node.setdefault(char, {})
+            ids = node.setdefault('', [])
+            if len(ids) < NODE_CAPACITY and id_ not in ids:
+                ids.append(id_)
+
+    def prefix(self, key):
+        node = self.root
+        for char in key:
+            node = node.get(char)
+            if node is None:
+                return []
+        return node.get('', [])
+
+
+class SymbolIndex:
+    # Prefix tries over symbols and over the words of company names, plus a
+    # trigram index for typos and substrings. Results are ranked by match
+    # kind first (exact symbol, symbol prefix, name word prefix, trigram),
+    # then by position in the symbol file.
+    def __init__(self, entries):
+        self.entries = []
+        self.by_symbol = {}
+        self.symbols = _Trie()
+        self.words = _Trie()
+        self.trigrams = {}
+
+        for symbol, name in entries:
+            if symbol in self.by_symbol:
+                continue
+            id_ = len(self.entries)
+            self.entries.append((symbol, name))
+            self.by_symbol[symbol] = id_
+            self.symbols.add(symbol.lower(), id_)
+            for word in _WORD.findall(name.lower()):
+                self.words.add(word, id_)
+            for gram in _trigrams(f'{symbol} {name}'.lower()):
+                self.trigrams.setdefault(gram, []).append(id_)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def search(self, query, limit=SUGGESTION_LIMIT):
+        query = (query or '').strip().lower()
+        if not query:
+            return []
+
+        ranked = []
+        seen = set()
+
+        def take(ids):
+            for id_ in ids:
+                if id_ not in seen:
+                    seen.add(id_)
+                    ranked.append(id_)
+
+        exact = self.by_symbol.get(query.upper())
+        take([] if exact is None else [exact])
+        take(self.symbols.prefix(query))
+
+        # Every word of the query has to start a word of the name.
+        words = _WORD.findall(query)
+        if words:
+            matches = [set(self.words.prefix(word)) for word in words]
+            take(sorted(set.intersection(*matches)))
+
+        if len(ranked) < limit and len(query) >= 3:
+            grams = _trigrams(query)
+            counts = {}
+            for gram in grams:
+                for id_ in self.trigrams.get(gram, ()):
+                    counts[id_] = counts.get(id_, 0) + 1
+            threshold = max(2, round(len(grams) * 0.6))
+            take(sorted((id_ for id_, count in counts.items() if count >= threshold), key=lambda id_: (-counts[id_], id_)))
+
+        return [self.entries[id_] for id_ in ranked[:limit]]
+
+
+class SymbolUniverse:
+    # The index of the local symbol file, or of the most-active list while
+    # no file is available; rebuilt when the fallback list changes.
+    def __init__(self, path=SYMBOLS_FILE, fallback=None):
+        self.path = path
+        self.fallback = fallback
+        self._index = None
+        self._fallback_key = None
+        self._lock = threading.Lock()
+
+    def index(self):
+        with self._lock:
+            if self._index is None:
+                entries = load_symbols(self.path)
+                if entries:
+                    self._index = SymbolIndex(entries)
+                    return self._index
+            elif self._fallback_key is None:
+                return self._index
+
+            symbols = tuple(self.fallback()) if self.fallback else ()
+            if self._index is None or symbols != self._fallback_key:
+                self._index = SymbolIndex([(symbol, '') for symbol in symbols])
+                self._fallback_key = symbols
+            return self._index
+
+    def search(self, query, limit=SUGGESTION_LIMIT):
+        return self.index().search(query, limit)
@@ -0,0 +1,68 @@
+import base64
+import os
+
+import numpy as np
+
+# 'binary' sends trace arrays as base64 typed arrays ({'dtype', 'bdata'}),
+# which plotly.js >= 2.28 decodes directly; 'json' leaves plain number lists.
+FIGURE_TRANSPORT = os.getenv('FIGURE_TRANSPORT', 'binary')
+
+# float32 is used when its rounding error stays below this fraction of the
+# array's span, i.e. well under a pixel on any realistic chart.
+F4_SPAN_TOLERANCE = float(os.getenv('F4_SPAN_TOLERANCE', 1e-5))
+
+ARRAY_KEYS = ('x', 'y', 'open', 'high', 'low', 'close')
+
+
+def wall_clock_ms(index):
+    # Plotly reads numbers on a date axis as UTC milliseconds, so the local
+    # wall time is encoded as if it were UTC to keep the exchange's clock.
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    return (index.as_unit('ns').asi8 // 1_000_000).astype(np.float64)
+
+
+def fits_float32(values):
+    finite = values[np.isfinite(values)]
+    if len(finite) == 0:
+        return True
+    largest = np.abs(finite).max()
+    if largest > np.finfo(np.float32).max:
+        return False
+    span = finite.max() - finite.min()
+    return largest * np.finfo(np.float32).eps <= F4_SPAN_TOLERANCE * (span or largest or 1.0)
+
+
+def typed_array(values, exact=False):
+    values = np.asarray(values, dtype=np.float64)
+    dtype = '<f4' if not exact and fits_float32(values) else '<f8'
+    return {
+        'dtype': dtype[1:],
+        'bdata': base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii'),
+    }
+
+
+def encode_figure(figure, shared=()):
+    # Rewrites numeric trace arrays of a plotly JSON dict in place. Every
+    # group of trace indices in `shared` draws over one x array; it is sent
+    # once, under 'shared' as {'x': array, 'traces': [indices]}, and taken off
+    # those traces; the browser puts it back before plotting (the clientside
+    # callback that fills main-graph in app.py).
+    data = figure.get('data', [])
+    if shared:
+        figure['shared'] = [{'x': data[group[0]]['x'], 'traces': list(group)} for group in shared]
+        for group in shared:
+            for index in group:
+                del data[index]['x']
+
+    if FIGURE_TRANSPORT != 'binary':
+        return figure
+
+    for arrays in data + figure.get('shared', []):
+        for key in ARRAY_KEYS:
+            values = arrays.get(key)
+            if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+                # Dates stay exact: hover and zoom map them back to bars.
+                arrays[key] = typed_array(values, exact=key == 'x')
+
+    return figure
@@ -0,0 +1,48 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from functions import get_cached_stock_version
+from screener import WATCHLIST_FILE, load_watchlist
+
+# Tickers fetched in the background when a worker starts, so the first
+# requests find warm caches. WARMUP=0 turns it off.
+WARMUP = os.getenv('WARMUP', '1') != '0'
+WARMUP_WATCHLIST = os.getenv('WARMUP_WATCHLIST', WATCHLIST_FILE)
+WARMUP_THREADS = int(os.getenv('WARMUP_THREADS', 4))
+
+_started = False
+_started_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def _warm(name, loader, *args):
+    try:
+        loader(*args)
+        return True
+    except Exception as e:
+        logger.warning("warmup fetch failed", extra={'ticker': name, 'error': str(e)})
+        return False
+
+
+def warm_up(tickers):
+    # Goes through the shared cache, so workers that start together split
+    # the fetches through its leases instead of each hitting Yahoo.
+    with ThreadPoolExecutor(max_workers=WARMUP_THREADS) as pool:
+        results = pool.map(lambda ticker: _warm(ticker, get_cached_stock_version, ticker), tickers)
+        return dict(zip(tickers, results))
+
+
+def start_warmup(path=WARMUP_WATCHLIST):
+    # Returns immediately; only one warmup runs per process.
+    global _started
+    with _started_lock:
+        if not WARMUP or _started:
+            return None
+        _started = True
+
+    thread = threading.Thread(target=lambda: warm_up(load_watchlist(path)), name='warmup', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+# Like the benchmarks: the cache and the bar store go to a scratch directory
+# and no warm-up runs, set before any app module is imported.
+SCRATCH = tempfile.mkdtemp(prefix='finance-tests-')
+os.environ.update({
+    'CACHE_PATH': os.path.join(SCRATCH, 'cache.sqlite3'),
+    'STORE_DIR': os.path.join(SCRATCH, 'bars'),
+    'WARMUP': '0',
+    'LOG_LEVEL': 'WARNING',
+})
+os.environ.pop('PROMETHEUS_MULTIPROC_DIR', None)
+os.environ.pop('YAHOO_URL', None)
+sys.path[:0] = [os.path.join(ROOT, 'src'), os.path.join(ROOT, 'benchmarks')]
@@ -0,0 +1,50 @@
+import numpy as np
+
+from backtest import SPANS, STDS, WINDOWS, backtest_arrays
+from functions import bbands, macd_ind, stoch_ind
+from synthetic import make_ohlcv
+
+
+def total_return(position, close):
+    growth = 1.0
+    for t in range(len(close) - 1):
+        growth *= 1 + position[t] * (close[t + 1] / close[t] - 1)
+    return growth - 1
+
+
+def bollinger_position(close, middle, lower):
+    # Bar by bar: in below the lower band, out again at the middle band.
+    position, held = np.zeros(len(close)), 0.0
+    for t in range(len(close)):
+        if close[t] < lower[t]:
+            held = 1.0
+        elif close[t] >= middle[t]:
+            held = 0.0
+        position[t] = held
+    return position
+
+
+def test_backtest_signals_match_the_indicator_functions():
+    df = make_ohlcv(400, freq='1D', seed=7)
+    close, high, low = (df[c].to_numpy(dtype=np.float64) for c in ('Close', 'High', 'Low'))
+    results = backtest_arrays(close, high, low)
+
+    for i, window in enumerate(WINDOWS):
+        for j, std in enumerate(STDS):
+            middle, _, lower = bbands(df['Close'], window_size=window, num_of_std=std)
+            position = bollinger_position(close, middle.to_numpy(), lower.to_numpy())
+            assert np.isclose(results['bollinger'][i, j], total_return(position, close))
+
+        so = stoch_ind(df, window_size=3, lookback=window)
+        position = (so['%K'] > so['%D']).to_numpy(dtype=np.float64)
+        assert np.isclose(results['stoch'][i], total_return(position, close))
+
+    macd = macd_ind(df)
+    for i, span in enumerate(SPANS):
+        signal = macd['MACD'].ewm(span=span, adjust=False).mean()
+        if span == 9:
+            assert np.allclose(signal, macd['Signal'])
+        position = (macd['MACD'] > signal).to_numpy(dtype=np.float64)
+        assert np.isclose(results['macd'][i], total_return(position, close))
+
+    assert np.isclose(results['hold'], close[-1] / close[0] - 1)
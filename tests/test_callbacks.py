@@ -0,0 +1,47 @@
+import pytest
+
+import callbacks
+import functions
+from cache import shared_cache
+from synthetic import MOST_ACTIVE, FakeProvider, most_active_table
+
+
+@pytest.fixture(scope='module')
+def client():
+    # As in the benchmarks: synthetic bars, and a fresh most-active table so
+    # the scheduler has nothing to scrape.
+    saved = functions.bar_store.provider
+    for store in [functions.bar_store] + list(functions.bar_stores.values()):
+        store.provider = FakeProvider()
+    shared_cache.set('most_active', repr(()), most_active_table(MOST_ACTIVE))
+    import app
+    yield app.app.server.test_client()
+    for store in [functions.bar_store] + list(functions.bar_stores.values()):
+        store.provider = saved
+
+
+def graph(client, **kwargs):
+    _, body = callbacks.graph(**kwargs)
+    response = client.post('/_dash-update-component', json=body)
+    assert response.status_code == 200
+    return response.get_json()['response']
+
+
+def test_parameters_patch_only_the_figure_they_were_built_for(client):
+    full = graph(client, ticker='BASIS', indicators=('SO',), changed=('ticker',))
+    basis = full['figure-basis']['data']
+    assert 'layout' in full['figure']['data']
+
+    patched = graph(client, ticker='BASIS', indicators=('SO',), periods=30, changed=('periods',), basis=basis)
+    assert '__dash_patch_update' in patched['figure']['data']
+    assert 'figure-basis' not in patched
+
+    # Bars, view or width moved on since the browser's figure: rebuild it.
+    for stale in (
+        [basis[0], basis[1][:-1] + [basis[1][-1] + 1], basis[2], basis[3]],
+        [basis[0], basis[1], ['2020-01-01', '2020-06-01'], basis[3]],
+        [basis[0], basis[1], basis[2], basis[3] + 200],
+    ):
+        rebuilt = graph(client, ticker='BASIS', indicators=('SO',), periods=30, changed=('periods',), basis=stale)
+        assert 'layout' in rebuilt['figure']['data']
+        assert rebuilt['figure-basis']['data'] == basis
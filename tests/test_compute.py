@@ -0,0 +1,51 @@
+import os
+import subprocess
+import sys
+
+from compute import ComputePool, SharedFrames
+from figures import render_figure
+from prometheus_client import REGISTRY
+
+from metrics import instrumented
+from synthetic import make_ohlcv
+
+
+def phase_count(callback, name):
+    return REGISTRY.get_sample_value('finance_phase_seconds_count', {'callback': callback, 'phase': name}) or 0
+
+
+def frame():
+    df = make_ohlcv(2000, freq='1h')
+    df.attrs.update(ticker='POOL', interval='1h', version=('1h', 2000, int(df.index.asi8[-1]), 0, 0))
+    return df
+
+
+def test_offloaded_figure_matches_and_keeps_its_phases(tmp_path):
+    pool = ComputePool(1, SharedFrames(root=str(tmp_path)))
+    df = frame()
+    args = ('POOL', ['OBV', 'MACD'], 2, 20, 3)
+
+    @instrumented('offload_test')
+    def render():
+        return pool.run(render_figure, df, *args)
+
+    try:
+        before = phase_count('offload_test', 'figure')
+        assert render() == render_figure(df, *args)
+        assert pool.stats()['offloaded'] == 1
+        assert phase_count('offload_test', 'figure') == before + 1
+    finally:
+        pool.frames.clear()
+
+
+def test_sweep_removes_files_of_dead_workers(tmp_path):
+    dead = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True).stdout.strip()
+    stale = tmp_path / f'finance-{dead}-0123456789abcdef0123.bin'
+    live = tmp_path / f'finance-{os.getpid()}-0123456789abcdef0123.bin'
+    other = tmp_path / 'unrelated.bin'
+    for path in (stale, live, other):
+        path.write_bytes(b'\0' * 8)
+
+    assert SharedFrames(root=str(tmp_path)).sweep() == 1
+    assert not stale.exists()
+    assert live.exists() and other.exists()
@@ -0,0 +1,61 @@
+import base64
+
+import numpy as np
+import orjson
+
+from downsample import lttb, point_budget, width_bucket
+from figures import figure_cache, get_figure_payload, parameter_traces, render_figure
+from indicators import indicator_service
+from synthetic import make_ohlcv
+from transport import wall_clock_ms
+
+
+def frame(rows=3000):
+    df = make_ohlcv(rows, freq='1D')
+    df.attrs.update(ticker='FIG', interval='1d', version=('1d', rows, int(df.index.asi8[-1]), 0, 0))
+    return df
+
+
+def test_nearby_widths_share_a_cached_figure():
+    df = frame()
+    args = ('FIG', ['OBV', 'SO'], 2, 20, 3)
+
+    assert width_bucket(1187) == width_bucket(1243) == 1200
+    assert point_budget(1187) == point_budget(1200)
+
+    first, _ = get_figure_payload(df, *args, width=1187)
+    hits = figure_cache.hits
+    again, _ = get_figure_payload(df, *args, width=1243)
+    assert figure_cache.hits == hits + 1
+    assert orjson.dumps(again) == orjson.dumps(first)
+
+
+def decode(array):
+    return np.frombuffer(base64.b64decode(array['bdata']), dtype='<' + array['dtype'])
+
+
+def test_every_subplot_is_downsampled_on_its_own_values():
+    df = frame()
+    figure = orjson.loads(render_figure(df, 'FIG', ['OBV', 'SO'], 2, 20, 3, width=400)[0])
+
+    assert [group['traces'] for group in figure['shared']] == [[1, 2, 3], [4, 5], [6, 7]]
+    assert all('x' not in figure['data'][i] for i in range(1, 8))
+
+    x = wall_clock_ms(df.index)
+    obv = indicator_service.compute(df, 'OBV')['OBV'].astype(np.float64)
+    so = indicator_service.compute(df, 'SO', lookback=20, window_size=3)['%D'].astype(np.float64)
+    for group, y in ((figure['shared'][0], df['Close'].to_numpy(dtype=np.float64)), (figure['shared'][1], obv), (figure['shared'][2], so)):
+        assert np.array_equal(decode(group['x']), x[lttb(x, y, point_budget(400)[1])])
+
+
+def test_parameter_patch_matches_a_full_build():
+    df = frame()
+    indicators = ['OBV', 'SO']
+    traces, shared = parameter_traces(df, indicators, 3, 30, 3, {'std', 'periods'}, width=400)
+    figure = orjson.loads(render_figure(df, 'FIG', indicators, 3, 30, 3, width=400)[0])
+
+    assert sorted(traces) == [1, 2, 3, 6, 7]
+    for index, trace in traces.items():
+        assert np.array_equal(decode(trace['y']), decode(figure['data'][index]['y']), equal_nan=True)
+    assert list(shared) == [2]
+    assert np.array_equal(decode(shared[2]), decode(figure['shared'][2]['x']))
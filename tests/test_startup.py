@@ -0,0 +1,42 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Budget for the app's own module bodies: layout, callback registration and
+# everything the app modules do at import time, after the third-party
+# libraries are loaded. Workers must not wait on anything remote to boot.
+STARTUP_BUDGET = float(os.getenv('STARTUP_BUDGET', 0.5))
+
+CODE = '''
+import json, socket, threading, time
+import colorlover, dash, dash_bootstrap_components, dash_loading_spinners, dash_mantine_components
+import numpy, orjson, pandas, plotly.subplots, prometheus_client, yfinance
+
+attempts = []
+
+def connect(self, address):
+    if threading.current_thread() is threading.main_thread():
+        attempts.append(repr(address))
+    raise OSError('network is blocked')
+
+socket.socket.connect = connect
+start = time.perf_counter()
+import app
+print(json.dumps({'seconds': time.perf_counter() - start, 'attempts': attempts}))
+'''
+
+
+def test_import_app_is_offline_and_fast():
+    # A fresh interpreter, as a gunicorn worker boots.
+    out = subprocess.run(
+        [sys.executable, '-c', CODE], cwd=os.path.join(ROOT, 'src'), env=os.environ.copy(),
+        capture_output=True, text=True, timeout=120
+    )
+    assert out.returncode == 0, out.stderr
+    result = json.loads(out.stdout.strip().splitlines()[-1])
+
+    assert result['attempts'] == []
+    assert result['seconds'] < STARTUP_BUDGET
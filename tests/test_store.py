@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import functions
+from functions import INDICATOR_WARMUP, get_bar_store, get_cached_stock_data
+from store import period_start
+from synthetic import FakeProvider
+
+
+@pytest.fixture(autouse=True)
+def fake_provider():
+    saved = functions.bar_store.provider
+    for store in [functions.bar_store] + list(functions.bar_stores.values()):
+        store.provider = FakeProvider()
+    yield
+    for store in [functions.bar_store] + list(functions.bar_stores.values()):
+        store.provider = saved
+
+
+@pytest.mark.parametrize('period', ['1mo', '1y', '3y'])
+def test_frames_cover_the_period_and_the_warm_up(period):
+    # The store keeps everything it ever fetched; a shorter period only
+    # gets its own bars and the warm-up before them.
+    stored = get_cached_stock_data('SLICE', period='max')
+    df = get_cached_stock_data('SLICE', period=period)
+    start = period_start(period, now=df.index[-1])
+
+    assert df.index[0] < start
+    assert (df.index < start).sum() >= INDICATOR_WARMUP
+    assert len(df) < len(stored)
+    assert df.attrs['version'] != stored.attrs['version']
+
+
+def test_intraday_bars_past_the_retention_are_dropped():
+    store = get_bar_store('5m')
+    store.refresh('TRIM', '5d')
+    bars = np.array(store.read('TRIM'))
+
+    # Bars from long before the upstream window, as if stored months ago.
+    old = bars.copy()
+    old['ts'] -= pd.Timedelta(days=120).value
+    store._rewrite('TRIM', np.concatenate([old, bars]), 'America/New_York')
+
+    store.refresh('TRIM', '5d')
+    kept = store.read('TRIM')
+    assert len(kept) == len(bars)
+    assert kept['ts'][0] == bars['ts'][0]
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from functions import adl_ind, bbands, macd_ind, obv_ind, stoch_ind
+from indicators import INDICATORS, IndicatorService, frame_bars
+from streaming import IndicatorStream, StreamingEngine
+from synthetic import make_ohlcv
+
+PARAMS = {
+    'OBV': {'signal': 9},
+    'MACD': {'fast': 12, 'slow': 26, 'signal': 9},
+    'SO': {'lookback': 14, 'window_size': 3, 'signal': 9},
+    'A/D': {'signal': 9},
+    'BB': {'window_size': 10, 'num_of_std': 5},
+}
+
+
+def assert_same(actual, expected):
+    assert set(actual) == set(expected)
+    for key in expected:
+        np.testing.assert_allclose(actual[key], expected[key], rtol=1e-9, atol=1e-9, equal_nan=True, err_msg=key)
+
+
+def cut(bars, n):
+    return {field: values[:n].copy() for field, values in bars.items()}
+
+
+@pytest.fixture
+def bars():
+    return frame_bars(make_ohlcv(600))
+
+
+@pytest.fixture
+def gapped(bars):
+    # Missing prices and volume in the middle and right before the end.
+    bars = {field: values.copy() for field, values in bars.items()}
+    bars['close'][50:60] = np.nan
+    bars['high'][200] = np.nan
+    bars['low'][201:204] = np.nan
+    bars['volume'][300] = np.nan
+    bars['close'][590] = np.nan
+    return bars
+
+
+@pytest.mark.parametrize('data', ['bars', 'gapped'])
+def test_kernels_match_functions(data, request):
+    bars = dict(request.getfixturevalue(data))
+    # Stored volume is an integer column and is never missing.
+    bars['volume'] = np.nan_to_num(bars['volume'])
+    df = pd.DataFrame({column: bars[column.lower()] for column in ('Open', 'High', 'Low', 'Close', 'Volume')})
+    middle, upper, lower = bbands(df['Close'])
+    references = {
+        'OBV': obv_ind(df)[['OBV', 'OBV Signal']],
+        'MACD': macd_ind(df)[['MACD', 'Signal']],
+        'SO': stoch_ind(df)[['%K', '%D', 'Signal']],
+        'A/D': adl_ind(df)[['A/D', 'Signal']],
+        'BB': pd.DataFrame({'Middle': middle, 'Upper': upper, 'Lower': lower}),
+    }
+    for name, reference in references.items():
+        assert_same(INDICATORS[name](bars, **PARAMS[name]), {key: reference[key].to_numpy() for key in reference})
+
+
+@pytest.mark.parametrize('data', ['bars', 'gapped'])
+def test_engine_matches_kernels(data, request):
+    bars = request.getfixturevalue(data)
+    out = StreamingEngine(PARAMS).run(bars)
+    for name, params in PARAMS.items():
+        assert_same(out[name], INDICATORS[name](bars, **params))
+
+
+@pytest.mark.parametrize('data', ['bars', 'gapped'])
+@pytest.mark.parametrize('name', list(PARAMS))
+def test_stream_extends_like_batch(name, data, request):
+    bars = request.getfixturevalue(data)
+    params = PARAMS[name]
+    head = cut(bars, 580)
+    stream = IndicatorStream(name, params, head, INDICATORS[name](head, **params))
+
+    for n in range(581, 601):
+        assert_same(stream.extend(cut(bars, n)), INDICATORS[name](cut(bars, n), **params))
+
+
+@pytest.mark.parametrize('name', list(PARAMS))
+def test_stream_revises_last_bar(name, gapped):
+    params = PARAMS[name]
+    head = cut(gapped, 590)
+    stream = IndicatorStream(name, params, head, INDICATORS[name](head, **params))
+    first = stream.extend(cut(gapped, 595))
+    kept = {key: values.copy() for key, values in first.items()}
+
+    # The last bar changes in place, then again together with a new bar.
+    revised = cut(gapped, 595)
+    revised['close'][-1] *= 1.02
+    revised['high'][-1] *= 1.03
+    assert_same(stream.extend(revised), INDICATORS[name](revised, **params))
+
+    grown = cut(gapped, 596)
+    grown['close'][-2] *= 0.98
+    assert_same(stream.extend(grown), INDICATORS[name](grown, **params))
+
+    # Results handed out before the revisions are left as they were.
+    assert_same(first, kept)
+
+
+def test_stream_declines_other_series(bars):
+    head = cut(bars, 500)
+    stream = IndicatorStream('MACD', PARAMS['MACD'], head, INDICATORS['MACD'](head, **PARAMS['MACD']))
+
+    assert stream.extend(cut(bars, 499)) is None
+    other = cut(bars, 501)
+    other['close'][0] += 1
+    assert stream.extend(other) is None
+    # Too many new bars at once: recomputing is cheaper.
+    assert stream.extend(cut(bars, 600)) is None
+    assert stream.extend(cut(bars, 501)) is not None
+
+
+def test_service_extends_versioned_frames():
+    full = make_ohlcv(620)
+
+    def frame(n, close=None):
+        df = full.iloc[:n].copy()
+        if close is not None:
+            df.iloc[-1, df.columns.get_loc('Close')] = close
+        df.attrs.update(ticker='TEST', interval='1m', version=('1m', n, int(df.index.asi8[-1]), 0 if close is None else 1))
+        return df
+
+    service = IndicatorService()
+    requests = list(PARAMS.items())
+    service.compute_many(frame(600), requests)
+    for df in (frame(601), frame(602), frame(602, close=float(full['Close'].iloc[601]) * 1.01)):
+        results = service.compute_many(df, requests)
+        for (name, params), result in zip(requests, results):
+            assert_same(result, INDICATORS[name](frame_bars(df), **params))
+    assert service.extended == 3 * len(requests)
+
+
+def test_service_caches_stay_within_their_byte_budgets():
+    full = make_ohlcv(5000)
+    service = IndicatorService(results_bytes=400_000, bars_bytes=250_000, streams_bytes=400_000)
+    for i in range(6):
+        df = full.iloc[:4000 + i * 100].copy()
+        df.attrs.update(ticker=f'T{i}', interval='1m', version=('1m', len(df), int(df.index.asi8[-1]), 0))
+        service.compute_many(df, list(PARAMS.items()))
+
+    for cache in (service.results, service.bars_cache, service.streams):
+        stats = cache.stats()
+        assert stats['bytes'] <= stats['max_bytes']
+        assert stats['evictions'] > 0
@@ -0,0 +1,64 @@
+import json
+
+import pytest
+
+import functions
+from cache import CircuitBreaker, CircuitOpen
+from functions import NoIntradayData, get_bar_store, refresh_stock_data
+from store import InvalidRequest, NotFound
+from synthetic import FakeProvider
+
+
+def failing():
+    raise ConnectionError('upstream down')
+
+
+def missing():
+    raise NotFound('no such symbol')
+
+
+def test_breaker_ignores_not_found():
+    breaker = CircuitBreaker('test', failures=2, reset_after=60, ignore=(NotFound, InvalidRequest))
+    for _ in range(5):
+        with pytest.raises(NotFound):
+            breaker.call(missing)
+    assert breaker.stats()['state'] == 'closed'
+    assert breaker.call(lambda: 1) == 1
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            breaker.call(failing)
+    with pytest.raises(CircuitOpen):
+        breaker.call(lambda: 1)
+
+
+class GarbageProvider(FakeProvider):
+    def history(self, *args, **kwargs):
+        raise json.JSONDecodeError('Expecting value', '<html>', 0)
+
+
+@pytest.fixture
+def provider():
+    store = get_bar_store('1d')
+    saved = store.provider
+    store.provider = FakeProvider()
+    yield store
+    store.provider = saved
+
+
+def test_undecodable_answer_falls_back_to_stored_bars(provider):
+    version = refresh_stock_data('FALL', '1y')
+    provider.provider = GarbageProvider()
+    assert refresh_stock_data('FALL', '1y') == version
+
+
+def test_missing_intraday_bars_are_not_an_unknown_ticker():
+    # FakeProvider serves no bars for ZZZZ at any interval.
+    store = get_bar_store('5m')
+    saved, store.provider = store.provider, FakeProvider()
+    try:
+        with pytest.raises(NoIntradayData):
+            refresh_stock_data('ZZZZ', '5d', '5m')
+        assert not functions.is_unknown_ticker('ZZZZ')
+    finally:
+        store.provider = saved